@@ -0,0 +1,209 @@
+import io
+import sys
+import json
+import time
+import platform
+import argparse
+import contextlib
+import statistics
+import gurobipy as gp
+
+from gurobipy import GRB
+
+from GateModel.GateAssignmentProblem import GateAssignmentProblem
+from GateModel.apronMinimization import findMinApron
+from GateModel.BuildModel import FORMULATIONS
+
+STAGES = ['generate_problem_data', 'findMinApron', 'BuildGateModel', 'optimize', 'extract_results']
+
+def benchmark_configs() -> dict:
+    """The fixed matrix of configs, {name: config}. Changing it invalidates saved baselines."""
+    configs = {}
+    for n_aircraft in (5, 10, 15):
+        for n_gates in (3, 5):
+            configs[f'ac{n_aircraft}_gates{n_gates}'] = {'num_dom_aircraft': n_aircraft, 'num_dom_gates': n_gates, 'dom_turnover': 1}
+
+    for layout in ('BER', 'VIE'):
+        for n_aircraft in (10, 15):
+            configs[f'ac{n_aircraft}_{layout}'] = {'num_dom_aircraft': n_aircraft, 'num_dom_gates': layout, 'dom_turnover': 1}
+
+    for time_disc in (0.1666, 1, 5):
+        configs[f'ac10_gates3_disc{time_disc}'] = {'num_dom_aircraft': 10, 'num_dom_gates': 3, 'dom_turnover': 1, 'time_disc': time_disc}
+
+    configs['ac8_int4_gates3_1'] = {'num_dom_aircraft': 8, 'num_dom_gates': 3, 'num_int_aircraft': 4, 'num_int_gates': 1,
+                                    'dom_turnover': 1, 'int_turnover': 2}
+    return configs
+
+def time_stages(config, time_limit=60, solve_options=None) -> tuple[dict, dict]:
+    """
+    Runs the pipeline once for config and returns {stage: seconds} and the solver counters,
+    Gurobi work units are a deterministic measure of the optimize effort next to its wall time.
+    The bound at the end of the root node is recorded as root_bound, the rows of the lazy formulation are separated here.
+    """
+    solve_options = solve_options or {}
+    timings = {}
+
+    # The constructor seeds and generates the data, including its own findMinApron call,
+    # which is left out here as it is timed as a stage of its own below
+    t_start = time.perf_counter()
+    problem = GateAssignmentProblem(**config)
+    timings['generate_problem_data'] = time.perf_counter() - t_start - problem.generation_times['apron_time']
+
+    t_start = time.perf_counter()
+    findMinApron(problem.dom_aircraft_times, problem.int_aircraft_times, problem.dom_gates, problem.int_gates,
+                 engine=problem.config['apron_engine'])
+    timings['findMinApron'] = time.perf_counter() - t_start
+
+    builder = problem.BUILDERS[solve_options.get('builder', 'loop')]
+    build_options = {'all_aircraft_times': problem.all_aircraft_times,
+                     **{name: value for name, value in solve_options.items() if name != 'builder'}}
+    t_start = time.perf_counter()
+    model, x, y = builder(
+        problem.num_aircraft, problem.all_aircraft, problem.g, problem.gates_available_per_ac,
+        problem.p_ij, problem.e_i, problem.f_i, problem.d_kl, problem.ed_k,
+        problem.dom_gates, problem.dom_aircraft, problem.int_gates, problem.int_aircraft,
+        problem.distinct_times, problem.comp_ir, problem.NA_star, **build_options
+    )
+    timings['BuildGateModel'] = time.perf_counter() - t_start
+
+    # Single thread so the timings do not depend on the load of the machine
+    model.Params.OutputFlag = 0
+    model.Params.Threads = 1
+    model.Params.TimeLimit = time_limit
+    root = {}
+    def callback(m, where):
+        if model._lazy is not None:
+            model._lazy.separate(m, where)
+        if where == GRB.Callback.MIP and m.cbGet(GRB.Callback.MIP_NODCNT) == 0:
+            root['bound'] = m.cbGet(GRB.Callback.MIP_OBJBND)
+    t_start = time.perf_counter()
+    model.optimize(callback)
+    timings['optimize'] = time.perf_counter() - t_start
+
+    t_start = time.perf_counter()
+    problem.extract_results(model, x, timings['BuildGateModel'], timings['optimize'], [])
+    timings['extract_results'] = time.perf_counter() - t_start
+
+    if model.Status == GRB.OPTIMAL and model.NodeCount <= 1:
+        root['bound'] = model.ObjBound
+    counters = {'work': model.Work, 'node_count': model.NodeCount, 'iter_count': model.IterCount, 'status': model.Status,
+                'root_bound': root.get('bound'), 'objective': model.ObjVal if model.SolCount > 0 else None}
+    model.dispose()
+    return timings, counters
+
+def run_benchmark(repeats=5, time_limit=60, configs=None, solve_options=None) -> dict:
+    """
+    Times every stage of every config repeats times and returns the baseline dict,
+    with the median, minimum and all runs per stage and the environment the timings were made in.
+    """
+    configs = configs or benchmark_configs()
+    results = {}
+    for n_config, (name, config) in enumerate(configs.items(), 1):
+        print(f'Benchmark {n_config}/{len(configs)}: {name}')
+        runs = []
+        for _ in range(repeats):
+            with contextlib.redirect_stdout(io.StringIO()): # the builders print their progress
+                timings, counters = time_stages(config, time_limit, solve_options)
+            runs.append(timings)
+
+        results[name] = {stage: {'median': statistics.median(run[stage] for run in runs),
+                                 'min': min(run[stage] for run in runs),
+                                 'runs': [run[stage] for run in runs]}
+                         for stage in STAGES}
+        results[name]['counters'] = counters
+
+    return {
+        'environment': {'python': platform.python_version(), 'gurobi': '.'.join(map(str, gp.gurobi.version())),
+                        'platform': platform.platform(), 'processor': platform.processor()},
+        'repeats': repeats,
+        'time_limit': time_limit,
+        'solve_options': solve_options or {},
+        'results': results,
+    }
+
+def compare_formulations(formulations, repeats=5, time_limit=60, configs=None, solve_options=None) -> dict:
+    """
+    Runs the benchmark once per formulation and returns {config: {formulation: summary}} with the root bound,
+    node count, median optimize time and objective, to compare the strength of the formulations side by side.
+    """
+    runs = {formulation: run_benchmark(repeats, time_limit, configs, {**(solve_options or {}), 'formulation': formulation})
+            for formulation in formulations}
+
+    comparison = {}
+    for name in runs[formulations[0]]['results']:
+        comparison[name] = {}
+        for formulation, run in runs.items():
+            result = run['results'][name]
+            comparison[name][formulation] = {'root_bound': result['counters']['root_bound'],
+                                             'node_count': result['counters']['node_count'],
+                                             'optimize': result['optimize']['median'],
+                                             'objective': result['counters']['objective']}
+
+    print(f'\n{"config":<24}{"formulation":<12}{"root bound":>14}{"nodes":>10}{"optimize [s]":>14}{"objective":>12}')
+    for name, summaries in comparison.items():
+        for formulation, summary in summaries.items():
+            root_bound = f'{summary["root_bound"]:.1f}' if summary['root_bound'] is not None else '-'
+            print(f'{name:<24}{formulation:<12}{root_bound:>14}{summary["node_count"]:>10.0f}'
+                  f'{summary["optimize"]:>14.3f}{summary["objective"] if summary["objective"] is not None else "-":>12}')
+    return comparison
+
+def compare_to_baseline(current, baseline, threshold=0.25, min_seconds=0.05) -> list:
+    """
+    Returns the regressions of current against baseline as (config, stage, baseline median, current median).
+    A stage regresses when its median is more than threshold (relative) and min_seconds (absolute) slower,
+    the absolute margin keeps stages of a few microseconds from failing on timer noise.
+    """
+    regressions = []
+    for name, stages in current['results'].items():
+        if name not in baseline['results']:
+            continue
+        for stage in STAGES:
+            timing, old = stages[stage], baseline['results'][name].get(stage)
+            if old is None:
+                continue
+            if timing['median'] > old['median'] * (1 + threshold) and timing['median'] - old['median'] > min_seconds:
+                regressions.append((name, stage, old['median'], timing['median']))
+    return regressions
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Time the stages of the gate model pipeline over a fixed set of configs.')
+    parser.add_argument('--output', default='Benchmark/benchmark_results.json', help='where to write the timings')
+    parser.add_argument('--baseline', default=None, help='saved timings to compare against, fails on a regression')
+    parser.add_argument('--threshold', type=float, default=0.25, help='allowed relative slowdown of a stage median')
+    parser.add_argument('--min-seconds', type=float, default=0.05, help='slowdowns below this many seconds are ignored')
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--time-limit', type=float, default=60)
+    parser.add_argument('--builder', default='loop', choices=list(GateAssignmentProblem.BUILDERS))
+    parser.add_argument('--formulation', default='linearized', choices=FORMULATIONS)
+    parser.add_argument('--formulations', nargs='+', default=None, choices=FORMULATIONS,
+                        help='also compare root bound, node count and time of these formulations')
+    args = parser.parse_args()
+
+    solve_options = {'builder': args.builder, 'formulation': args.formulation}
+    current = run_benchmark(repeats=args.repeats, time_limit=args.time_limit, solve_options=solve_options)
+    if args.formulations:
+        current['formulation_comparison'] = compare_formulations(args.formulations, args.repeats, args.time_limit,
+                                                                 solve_options={'builder': args.builder})
+    with open(args.output, 'w') as f:
+        json.dump(current, f, indent=2)
+    print(f'Timings saved to {args.output}')
+
+    if args.baseline is None:
+        return
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if baseline['environment'] != current['environment']:
+        print(f'Warning: baseline was made in a different environment {baseline["environment"]}')
+
+    regressions = compare_to_baseline(current, baseline, args.threshold, args.min_seconds)
+    for name, stage, old, new in regressions:
+        print(f'REGRESSION {name} {stage}: {old:.4f}s -> {new:.4f}s ({new / old - 1:+.0%})')
+
+    if regressions:
+        sys.exit(1)
+    print(f'No regressions beyond {args.threshold:.0%} against {args.baseline}')
+
+
+if __name__ == '__main__':
+    main()
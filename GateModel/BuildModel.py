@@ -1,30 +1,131 @@
+import time
 from gurobipy import quicksum, GRB, Model
+from typing import List
+
+from GateModel.ConstructParameters import getMaximalCliques, getOverlappingPairs
+from GateModel.gurobiEnv import getEnv
+from GateModel.lazyConstraints import LazyLinearization
+
+NO_OVERLAP_FORMULATIONS = ['interval', 'clique', 'pairwise', 'auto']
+AUTO_CLIQUE_MIN_AIRCRAFT = 6 # below this the maximal cliques are mostly pairs anyway
+FORMULATIONS = ['linearized', 'quadratic', 'lazy', 'rlt']
+Y_FORMULATIONS = ['linearized', 'lazy', 'rlt'] # the formulations with y-variables
+BUILD_PHASES = ['vars', 'objective', 'constr_assign', 'constr_no_overlap', 'constr_apron', 'constr_linearize']
+
+def getTransferPairs(num_aircraft:int, all_aircraft:list, p_ij:dict, sparse:bool=False) -> List[tuple[int, int]]:
+    '''
+    Returns the aircraft index pairs (i,j), i<j, that get y-variables.
+    If sparse, only pairs with transfer passengers in either direction are kept,
+    the y-variables of the other pairs have zero cost and can never be binding.
+    '''
+    pairs = []
+    for i in range(num_aircraft - 1):
+        ac_i = all_aircraft[i]
+        for j in range(i+1, num_aircraft):
+            ac_j = all_aircraft[j]
+            if sparse and p_ij[ac_i][ac_j] == 0 and p_ij[ac_j][ac_i] == 0:
+                continue
+            pairs.append((i,j))
+    return pairs
+
+def countPrunedTransferVars(num_aircraft:int, all_aircraft:list, gates_available_per_ac:dict, pairs:list) -> int:
+    '''Returns the number of y-variables the dense model has that are not created for the given pairs'''
+    kept  = set(pairs)
+    count = 0
+    for i in range(num_aircraft - 1):
+        for j in range(i+1, num_aircraft):
+            if (i,j) not in kept:
+                count += len(gates_available_per_ac[all_aircraft[i]]) * len(gates_available_per_ac[all_aircraft[j]])
+    return count
+
+def recordPhase(m:Model, phase:str, t_start:float) -> float:
+    '''Stores the time since t_start as build phase of m in m._build_times and returns the current time'''
+    now = time.time()
+    m._build_times[phase] = now - t_start
+    return now
+
+def checkFormulation(formulation:str) -> None:
+    if formulation not in FORMULATIONS:
+        raise ValueError(f'Unknown formulation {formulation}, choose from {FORMULATIONS}')
+
+def chooseNoOverlapFormulation(no_overlap:str, num_aircraft:int) -> str:
+    '''Resolves 'auto' to the no-overlap formulation used for an instance of this size'''
+    if no_overlap not in NO_OVERLAP_FORMULATIONS:
+        raise ValueError(f'Unknown no-overlap formulation {no_overlap}, choose from {NO_OVERLAP_FORMULATIONS}')
+    if no_overlap == 'auto':
+        return 'clique' if num_aircraft >= AUTO_CLIQUE_MIN_AIRCRAFT else 'pairwise'
+    return no_overlap
+
+def getNoOverlapRows(gates:list, aircraft:list, distinct_times:list, comp_ir:dict, all_aircraft_times:dict,
+                     no_overlap:str='interval') -> List[tuple[str, List[tuple[str, int]], str]]:
+    '''
+    Returns the rows of constraint (3) for one aircraft type as (gate, [(ac, coefficient), ...], name).
+    'interval': one row per gate per elementary interval of distinct_times, as in the paper
+    'clique':   one row per gate per maximal clique of the interval graph, these dominate the interval rows
+    'pairwise': one row per gate per pair of overlapping aircraft
+    '''
+    times = {ac: all_aircraft_times[ac] for ac in aircraft} if no_overlap != 'interval' else None
+
+    if no_overlap == 'interval':
+        sets = [(f'interval{r}', [(ac, comp_ir[ac][r]) for ac in aircraft]) for r in range(len(distinct_times) - 1)]
+    elif no_overlap == 'clique':
+        # Single aircraft cliques are already covered by constraints (1) and (2)
+        sets = [(f'clique{c}', [(ac, 1) for ac in clique]) for c, clique in enumerate(getMaximalCliques(times)) if len(clique) > 1]
+    elif no_overlap == 'pairwise':
+        sets = [(f'pair_{i}_{j}', [(i, 1), (j, 1)]) for (i, j) in getOverlappingPairs(times)]
+    else:
+        raise ValueError(f'Unknown no-overlap formulation {no_overlap}')
+
+    rows = []
+    for k in gates:
+        if k == 'apron':
+            continue
+        for set_name, members in sets:
+            rows.append((k, members, f'no_overlap_gate{k}_{set_name}'))
+    return rows
 
 def BuildGateModel(num_aircraft, all_aircraft,g,gates_available_per_ac,p_ij,e_i,f_i,d_kl,ed_k,dom_gates,dom_aircraft,
-                   int_gates,int_aircraft,distinct_times,comp_ir,NA_star, write_to_file=None):
-
-    '''Build model according to (Karsu, Azizoğlu & Alanli, 2021)'''
+                   int_gates,int_aircraft,distinct_times,comp_ir,NA_star, write_to_file=None, sparse=False,
+                   no_overlap='interval', all_aircraft_times=None, formulation='linearized', env=None):
+
+    '''
+    Build model according to (Karsu, Azizoğlu & Alanli, 2021)
+    If sparse, y-variables and constraints (6) are only created for aircraft pairs with transfer passengers.
+    The number of skipped y-variables is stored in m._pruned_y_vars.
+    no_overlap selects the formulation of constraint (3), see getNoOverlapRows. 'clique' and 'pairwise' need all_aircraft_times,
+    'auto' picks one based on the number of aircraft. The formulation used is stored in m._no_overlap.
+    The time spent on each of BUILD_PHASES is stored in m._build_times.
+    The model is created in env, by default the shared environment of gurobiEnv.getEnv.
+    formulation='quadratic' leaves out the y-variables and constraints (6) and puts the products x_ik*x_jl
+    in the objective directly, Gurobi then linearizes the binary quadratic objective itself. y is returned empty.
+    formulation='lazy' builds the y-variables but leaves out constraints (6), they are stored in m._lazy
+    (a LazyLinearization) to be added in the MIP callback when a solution violates them.
+    formulation='rlt' replaces constraints (6) by the aggregated equalities of the Adams-Johnson (RLT) linearization,
+    sum_l y_ijkl = x_ik and sum_k y_ijkl = x_jl for every pair. These imply (6) for binary x and give a tighter LP bound.
+    '''
+    checkFormulation(formulation)
     
-    m = Model('distance')
+    m = Model('distance', env=env if env is not None else getEnv())
+    m._formulation = formulation
+    m._build_times = {}
     if write_to_file:
         m.params.LogFile = f'log_files/distance.log'
 
+    t_phase = time.time()
+    pairs = getTransferPairs(num_aircraft, all_aircraft, p_ij, sparse)
+    m._pruned_y_vars = countPrunedTransferVars(num_aircraft, all_aircraft, gates_available_per_ac, pairs) if sparse else 0
+
     print('Constructing the variables')
+    if sparse:
+        print(f'Sparse build, pruned {m._pruned_y_vars} y-variables without transfer passengers')
     y = {}
-    for i in range(num_aircraft - 1):
-        for j in range(i+1,num_aircraft):
-            ac_i = all_aircraft[i]
-            ac_j = all_aircraft[j]
+    for (i,j) in (pairs if formulation in Y_FORMULATIONS else []):
+        gates_i = gates_available_per_ac[all_aircraft[i]]
+        gates_j = gates_available_per_ac[all_aircraft[j]]
 
-            g_i = g[ac_i]
-            g_j = g[ac_j]
-
-            gates_i = gates_available_per_ac[ac_i]
-            gates_j = gates_available_per_ac[ac_j]
-
-            for k in gates_i:
-                for l in gates_j:
-                    y[i,j,k,l] = m.addVar(lb=0.0, vtype=GRB.CONTINUOUS, name=f'y_{i}_{j}_{k}_{l}')
+        for k in gates_i:
+            for l in gates_j:
+                y[i,j,k,l] = m.addVar(lb=0.0, vtype=GRB.CONTINUOUS, name=f'y_{i}_{j}_{k}_{l}')
 
 
     x = {}
@@ -33,13 +134,19 @@ def BuildGateModel(num_aircraft, all_aircraft,g,gates_available_per_ac,p_ij,e_i,
         for k in gates_i:
             x[ac, k] = m.addVar(vtype=GRB.BINARY, name=f"x_{ac}_{k}")
     m.update()
+    t_phase = recordPhase(m, 'vars', t_phase)
 
     print('Constructing objective function')
-    transfer_obj = quicksum( p_ij[all_aircraft[i]][all_aircraft[j]] * d_kl[k][l] * y[i,j,k,l]   # Same logic as y but compact
-                                    for i in range(num_aircraft-1)
-                                    for j in range(i+1, num_aircraft) 
-                                    for k in gates_available_per_ac[all_aircraft[i]]
-                                    for l in gates_available_per_ac[all_aircraft[j]])
+    if formulation in Y_FORMULATIONS:
+        transfer_obj = quicksum( p_ij[all_aircraft[i]][all_aircraft[j]] * d_kl[k][l] * y[i,j,k,l]   # Same logic as y but compact
+                                        for (i,j) in pairs
+                                        for k in gates_available_per_ac[all_aircraft[i]]
+                                        for l in gates_available_per_ac[all_aircraft[j]])
+    else:
+        transfer_obj = quicksum( p_ij[all_aircraft[i]][all_aircraft[j]] * d_kl[k][l] * x[all_aircraft[i],k] * x[all_aircraft[j],l]
+                                        for (i,j) in pairs
+                                        for k in gates_available_per_ac[all_aircraft[i]]
+                                        for l in gates_available_per_ac[all_aircraft[j]])
     
     domestic_obj = quicksum( (e_i[i] + f_i[i]) * ed_k[k] * x[i,k]
                                 for i in dom_aircraft
@@ -50,6 +157,7 @@ def BuildGateModel(num_aircraft, all_aircraft,g,gates_available_per_ac,p_ij,e_i,
                                 for k in int_gates)
 
     m.setObjective(transfer_obj + domestic_obj + internat_obj, GRB.MINIMIZE)
+    t_phase = recordPhase(m, 'objective', t_phase)
     
 
     # Adding constraints
@@ -63,41 +171,53 @@ def BuildGateModel(num_aircraft, all_aircraft,g,gates_available_per_ac,p_ij,e_i,
     # Constraints (2), Assign each int ac to exactly one int gate
     for j in int_aircraft:
         m.addConstr(quicksum(x[j,l] for l in int_gates) == 1, name=f'ac_{j}_single_gate')
+    t_phase = recordPhase(m, 'constr_assign', t_phase)
 
 
     # Constraint (3), no overlapping ac at a given gate, split into dom and int versions
-    for k in dom_gates:
-        if k == 'apron':
-            continue
+    m._no_overlap = chooseNoOverlapFormulation(no_overlap, num_aircraft)
+    for gates, aircraft in ((dom_gates, dom_aircraft), (int_gates, int_aircraft)):
+        for k, members, name in getNoOverlapRows(gates, aircraft, distinct_times, comp_ir, all_aircraft_times, m._no_overlap):
+            m.addConstr(quicksum(coef * x[ac, k] for ac, coef in members) <= 1, name=name)
+    t_phase = recordPhase(m, 'constr_no_overlap', t_phase)
 
-        for r in range(len(distinct_times) - 1):
-            m.addConstr(quicksum(comp_ir[ac][r] * x[ac, k] for ac in dom_aircraft) <= 1, name=f'no_overlap_gate{k}_interval{r}')
-
-    for k in int_gates:
-        if k == 'apron':
-            continue
-
-        for r in range(len(distinct_times) - 1):
-            m.addConstr(quicksum(comp_ir[ac][r] * x[ac, k] for ac in int_aircraft) <= 1, name=f'no_overlap_gate{k}_interval{r}')
-            
-     
 
 
     # Constraint (4), Honor minimum number of ac assigned to apron as calculated bymaximum cost network flow model
-    m.addConstr(quicksum(x[i,'apron'] for i in all_aircraft) == NA_star, name=f'Minimal_apron_ac')
+    m._apron_constr = m.addConstr(quicksum(x[i,'apron'] for i in all_aircraft) == NA_star, name=f'Minimal_apron_ac')
+    t_phase = recordPhase(m, 'constr_apron', t_phase)
 
     
     # Constraints (6), linearize original model
-    for i in range(num_aircraft - 1):
+    for (i,j) in (pairs if formulation == 'linearized' else []):
         ac_i = all_aircraft[i]
+        ac_j = all_aircraft[j]
         gates_i = gates_available_per_ac[ac_i]
+        gates_j = gates_available_per_ac[ac_j]
 
-        for j in range(i + 1, num_aircraft):
-            ac_j = all_aircraft[j]
-            gates_j = gates_available_per_ac[ac_j]
+        for k in gates_i:
+            for l in gates_j:
+                m.addConstr(y[i, j, k, l] >= x[ac_i, k] + x[ac_j, l] - 1, name=f"linearize_{i}_{j}_{k}_{l}")
+
+    # Constraints (6) as aggregated RLT equalities, one per pair and gate of either aircraft
+    for (i,j) in (pairs if formulation == 'rlt' else []):
+        ac_i = all_aircraft[i]
+        ac_j = all_aircraft[j]
+        gates_i = gates_available_per_ac[ac_i]
+        gates_j = gates_available_per_ac[ac_j]
 
-            for k in gates_i:
-                for l in gates_j:
-                    m.addConstr(y[i, j, k, l] >= x[ac_i, k] + x[ac_j, l] - 1, name=f"linearize_{i}_{j}_{k}_{l}")
+        for k in gates_i:
+            m.addConstr(quicksum(y[i, j, k, l] for l in gates_j) == x[ac_i, k], name=f"rlt_{i}_{j}_k{k}")
+        for l in gates_j:
+            m.addConstr(quicksum(y[i, j, k, l] for k in gates_i) == x[ac_j, l], name=f"rlt_{i}_{j}_l{l}")
+
+    m._lazy = None
+    if formulation == 'lazy':
+        m.Params.LazyConstraints = 1
+        keys = list(y)
+        m._lazy = LazyLinearization(m.getVars(), [y[key].index for key in keys],
+                                    [x[all_aircraft[i], k].index for (i, j, k, l) in keys],
+                                    [x[all_aircraft[j], l].index for (i, j, k, l) in keys])
+    recordPhase(m, 'constr_linearize', t_phase)
 
     return m,x,y
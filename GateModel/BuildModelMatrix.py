@@ -0,0 +1,193 @@
+import time
+import numpy as np
+import scipy.sparse as sp
+from gurobipy import GRB, Model
+
+from GateModel.gurobiEnv import getEnv
+from GateModel.BuildModel import getTransferPairs, countPrunedTransferVars, recordPhase, checkFormulation, chooseNoOverlapFormulation, getNoOverlapRows
+from GateModel.BuildModel import Y_FORMULATIONS
+from GateModel.lazyConstraints import LazyLinearization
+
+def getVariableIndex(num_aircraft:int, all_aircraft:list, gates_available_per_ac:dict, pairs:list,
+                     with_y:bool=True) -> tuple[dict, dict, np.ndarray, np.ndarray]:
+    '''
+    Returns the column layout of the model, y-variables first, then x-variables, in the same order as BuildGateModel.
+    x_col[ac,k] and y_col[i,j,k,l] give the column of each variable,
+    y_xk and y_xl give for every y-variable the columns of x[ac_i,k] and x[ac_j,l].
+    If not with_y, the model has only x-variables starting at column 0 and y_col numbers the transfer products instead.
+    '''
+    y_col = {}
+    for (i,j) in pairs:
+        for k in gates_available_per_ac[all_aircraft[i]]:
+            for l in gates_available_per_ac[all_aircraft[j]]:
+                y_col[i,j,k,l] = len(y_col)
+
+    num_y = len(y_col)
+    offset = num_y if with_y else 0
+    x_col = {}
+    for ac in all_aircraft:
+        for k in gates_available_per_ac[ac]:
+            x_col[ac,k] = offset + len(x_col)
+
+    y_xk = np.fromiter((x_col[all_aircraft[i],k] for (i,j,k,l) in y_col), dtype=np.int64, count=num_y)
+    y_xl = np.fromiter((x_col[all_aircraft[j],l] for (i,j,k,l) in y_col), dtype=np.int64, count=num_y)
+
+    return x_col, y_col, y_xk, y_xl
+
+def BuildGateModelMatrix(num_aircraft, all_aircraft,g,gates_available_per_ac,p_ij,e_i,f_i,d_kl,ed_k,dom_gates,dom_aircraft,
+                         int_gates,int_aircraft,distinct_times,comp_ir,NA_star, write_to_file=None, sparse=False, named=True,
+                         no_overlap='interval', all_aircraft_times=None, formulation='linearized', env=None):
+
+    '''
+    Build the same model as BuildGateModel with the gurobipy matrix API.
+    All variables are added with one addMVar call and every constraint family with one addMConstr call,
+    using sparse coefficient matrices built from numpy index arrays.
+    If named is False the variables and constraints are left unnamed, which saves building the name strings.
+    Returns (m, x, y) with x and y dicts of Var, like BuildGateModel.
+    With formulation='quadratic' the transfer products form the sparse Q matrix of the objective instead of y-variables,
+    with formulation='lazy' constraints (6) are left to the MIP callback through m._lazy
+    and with formulation='rlt' they are replaced by the aggregated equalities, see BuildGateModel.
+    The variables are created together with their objective coefficients, so that addMVar call counts as objective phase.
+    The model is created in env, by default the shared environment of gurobiEnv.getEnv.
+    '''
+    checkFormulation(formulation)
+
+    m = Model('distance', env=env if env is not None else getEnv())
+    m._formulation = formulation
+    m._build_times = {}
+    if write_to_file:
+        m.params.LogFile = f'log_files/distance.log'
+
+    t_phase = time.time()
+    pairs = getTransferPairs(num_aircraft, all_aircraft, p_ij, sparse)
+    m._pruned_y_vars = countPrunedTransferVars(num_aircraft, all_aircraft, gates_available_per_ac, pairs) if sparse else 0
+
+    print('Constructing the variables')
+    if sparse:
+        print(f'Sparse build, pruned {m._pruned_y_vars} y-variables without transfer passengers')
+    linearized = formulation in Y_FORMULATIONS
+    x_col, y_col, y_xk, y_xl = getVariableIndex(num_aircraft, all_aircraft, gates_available_per_ac, pairs, with_y=linearized)
+    num_terms = len(y_col)
+    num_y     = num_terms if linearized else 0
+    num_vars  = num_y + len(x_col)
+
+    vtype = np.full(num_vars, GRB.CONTINUOUS)
+    vtype[num_y:] = GRB.BINARY
+
+    var_names = None
+    if named:
+        var_names = [f'y_{i}_{j}_{k}_{l}' for (i,j,k,l) in y_col] if linearized else []
+        var_names += [f'x_{ac}_{k}' for (ac,k) in x_col]
+    t_phase = recordPhase(m, 'vars', t_phase)
+
+    print('Constructing objective function')
+    transfer = np.fromiter((p_ij[all_aircraft[i]][all_aircraft[j]] * d_kl[k][l] for (i,j,k,l) in y_col), dtype=float, count=num_terms)
+    obj = np.zeros(num_vars)
+    if linearized:
+        obj[:num_y] = transfer
+    for (ac,k), col in x_col.items():
+        obj[col] = (e_i[ac] + f_i[ac]) * ed_k[k]
+
+    v = m.addMVar(num_vars, lb=0.0, vtype=vtype, obj=obj, name=var_names)
+    if linearized:
+        m.ModelSense = GRB.MINIMIZE
+    else:
+        Q = sp.csr_matrix((transfer, (y_xk, y_xl)), shape=(num_vars, num_vars))
+        m.setMObjective(Q, obj, 0.0, sense=GRB.MINIMIZE)
+    t_phase = recordPhase(m, 'objective', t_phase)
+
+    print('Constructing constraints')
+    # Constraints (1) and (2), assign each ac to exactly one gate of its own type
+    rows = np.fromiter((r for r, ac in enumerate(all_aircraft) for k in gates_available_per_ac[ac]), dtype=np.int64)
+    cols = np.fromiter((x_col[ac,k] for ac in all_aircraft for k in gates_available_per_ac[ac]), dtype=np.int64)
+    A = sp.csr_matrix((np.ones(len(rows)), (rows, cols)), shape=(num_aircraft, num_vars))
+    m.addMConstr(A, v, GRB.EQUAL, np.ones(num_aircraft),
+                 name=[f'ac_{ac}_single_gate' for ac in all_aircraft] if named else '')
+    t_phase = recordPhase(m, 'constr_assign', t_phase)
+
+    # Constraint (3), no overlapping ac at a given gate, split into dom and int versions
+    m._no_overlap = chooseNoOverlapFormulation(no_overlap, num_aircraft)
+    rows, cols, vals, names = [], [], [], []
+    num_rows = 0
+    for gates, aircraft in ((dom_gates, dom_aircraft), (int_gates, int_aircraft)):
+        if m._no_overlap == 'interval' and aircraft:
+            # Vectorised version of the interval rows of getNoOverlapRows
+            num_intervals = len(distinct_times) - 1
+            comp = np.array([comp_ir[ac] for ac in aircraft], dtype=float).reshape(len(aircraft), num_intervals)
+            ac_idx, r_idx = np.nonzero(comp)
+            for k in gates:
+                if k == 'apron':
+                    continue
+                gate_cols = np.array([x_col[ac,k] for ac in aircraft], dtype=np.int64)
+                rows.append(num_rows + r_idx)
+                cols.append(gate_cols[ac_idx])
+                vals.append(comp[ac_idx, r_idx])
+                names.extend(f'no_overlap_gate{k}_interval{r}' for r in range(num_intervals))
+                num_rows += num_intervals
+            continue
+
+        for k, members, name in getNoOverlapRows(gates, aircraft, distinct_times, comp_ir, all_aircraft_times, m._no_overlap):
+            rows.append(np.full(len(members), num_rows, dtype=np.int64))
+            cols.append(np.array([x_col[ac,k] for ac, coef in members], dtype=np.int64))
+            vals.append(np.array([coef for ac, coef in members], dtype=float))
+            names.append(name)
+            num_rows += 1
+
+    if num_rows:
+        rows = np.concatenate(rows) if rows else np.zeros(0, dtype=np.int64)
+        cols = np.concatenate(cols) if cols else np.zeros(0, dtype=np.int64)
+        vals = np.concatenate(vals) if vals else np.zeros(0)
+        A = sp.csr_matrix((vals, (rows, cols)), shape=(num_rows, num_vars))
+        m.addMConstr(A, v, GRB.LESS_EQUAL, np.ones(num_rows), name=names if named else '')
+    t_phase = recordPhase(m, 'constr_no_overlap', t_phase)
+
+    # Constraint (4), Honor minimum number of ac assigned to apron as calculated by maximum cost network flow model
+    cols = np.array([x_col[ac,'apron'] for ac in all_aircraft], dtype=np.int64)
+    A = sp.csr_matrix((np.ones(len(cols)), (np.zeros(len(cols), dtype=np.int64), cols)), shape=(1, num_vars))
+    apron_constr = m.addMConstr(A, v, GRB.EQUAL, np.array([NA_star], dtype=float), name=['Minimal_apron_ac'] if named else '')
+    t_phase = recordPhase(m, 'constr_apron', t_phase)
+
+    # Constraints (6), linearize original model: y - x_ik - x_jl >= -1
+    if formulation == 'linearized' and num_y:
+        rows = np.repeat(np.arange(num_y), 3)
+        cols = np.column_stack((np.arange(num_y), y_xk, y_xl)).ravel()
+        vals = np.tile([1.0, -1.0, -1.0], num_y)
+        A = sp.csr_matrix((vals, (rows, cols)), shape=(num_y, num_vars))
+        m.addMConstr(A, v, GRB.GREATER_EQUAL, -np.ones(num_y),
+                     name=[f'linearize_{i}_{j}_{k}_{l}' for (i,j,k,l) in y_col] if named else '')
+
+    # Constraints (6) as aggregated RLT equalities: sum_l y_ijkl - x_ik = 0 and sum_k y_ijkl - x_jl = 0
+    if formulation == 'rlt' and num_y:
+        # Row of every y-variable in the k and l families, in the order of BuildGateModel
+        row_keys = {}
+        for (i,j) in pairs:
+            for k in gates_available_per_ac[all_aircraft[i]]:
+                row_keys[i,j,'k',k] = len(row_keys)
+            for l in gates_available_per_ac[all_aircraft[j]]:
+                row_keys[i,j,'l',l] = len(row_keys)
+        k_rows = np.fromiter((row_keys[i,j,'k',k] for (i,j,k,l) in y_col), dtype=np.int64, count=num_y)
+        l_rows = np.fromiter((row_keys[i,j,'l',l] for (i,j,k,l) in y_col), dtype=np.int64, count=num_y)
+
+        # Every row has its x-variable once, taken from the first y-variable in the row
+        x_rows, first = np.unique(np.concatenate((k_rows, l_rows)), return_index=True)
+        x_cols = np.concatenate((y_xk, y_xl))[first]
+
+        rows = np.concatenate((k_rows, l_rows, x_rows))
+        cols = np.concatenate((np.arange(num_y), np.arange(num_y), x_cols))
+        vals = np.concatenate((np.ones(2 * num_y), -np.ones(len(x_rows))))
+        A = sp.csr_matrix((vals, (rows, cols)), shape=(len(row_keys), num_vars))
+        m.addMConstr(A, v, GRB.EQUAL, np.zeros(len(row_keys)),
+                     name=[f'rlt_{i}_{j}_{side}{k}' for (i,j,side,k) in row_keys] if named else '')
+    recordPhase(m, 'constr_linearize', t_phase)
+
+    m.update()
+    m._apron_constr = apron_constr.tolist()[0]
+    variables = v.tolist()
+    m._lazy = None
+    if formulation == 'lazy':
+        m.Params.LazyConstraints = 1
+        m._lazy = LazyLinearization(variables, np.arange(num_y), y_xk, y_xl)
+    x = {key: variables[col] for key, col in x_col.items()}
+    y = {key: variables[col] for key, col in y_col.items()} if linearized else {}
+
+    return m,x,y
@@ -2,6 +2,8 @@
 import numpy as np
 from typing import Dict, List
 
+from GateModel.randomStreams import aircraftKey, componentUniform, uniformIndex, partnerUniforms
+
 
 
 def getAircraft(num:int = 1, ac_type:str = '') -> List[str]:
@@ -34,27 +36,53 @@ def getGates(num= 3, gate_type:str = '') -> List[str]:
     gates.append('apron')
     return gates
     
+def getTransferPassengerArray(arrivals:np.ndarray, departures:np.ndarray, num_aircraft:int,
+                              crn_seed:int = None, aircraft:list = None) -> np.ndarray:
+    '''
+    Returns p as an n x n int array, number of pax transferring from aircraft i to aircraft j
+    Aircraft that are on the ground together get a random number of transfers, drawn in one batch in the same
+    row-major order (and so with the same values for a given seed) as the original per-element loop.
+    Beyond 200 aircraft every overlapping pair gets 1 transfer passenger.
+    With a crn_seed, the transfers of every aircraft come from its own stream keyed on the names in aircraft,
+    with a fixed slot per partner aircraft, instead of from the global one.
+    '''
+    overlap = (arrivals[:, None] < departures[None, :]) & (arrivals[None, :] < departures[:, None])
+    np.fill_diagonal(overlap, False) # Stop self transfers
+
+    p = np.zeros((len(arrivals), len(arrivals)), dtype=np.int64)
+    max_transfers = max(int(200 / num_aircraft), 1)
+    if crn_seed is not None:
+        keys = [aircraftKey(ac) for ac in aircraft]
+        for i in np.flatnonzero(overlap.any(axis=1)):
+            partners = np.flatnonzero(overlap[i])
+            u = partnerUniforms(crn_seed, 'transfer', keys[i], [keys[j] for j in partners])
+            p[i, partners] = 1 + np.minimum((u * max_transfers).astype(np.int64), max_transfers - 1)
+    elif overlap.any():
+        p[overlap] = np.random.randint(1, max_transfers + 1, size=int(overlap.sum()))
+    return p
+
 def getTransferPassengers(all_aircraft:list, num_aircraft:int, all_aircraft_times:dict) -> Dict[str, Dict[str, int]]:
     '''
-    Returns symmetric p_ij matrix, number of pax transferring from aircraft i to aircraft j
+    Returns p_ij matrix as dict of dicts, number of pax transferring from aircraft i to aircraft j
     '''
-    p_ij = {i: {j: 0 for j in all_aircraft} for i in all_aircraft}
-    for idx_i, i in enumerate(all_aircraft):
-        ai, di = all_aircraft_times[i]
-        # for j in all_aircraft[idx_i + 1:]:
-        for idx_j, j in enumerate(all_aircraft):
-            if i == j: # Stop self transfers
-                p_ij[i][j] = 0
-                continue
+    arrivals, departures = getTimeArrays(all_aircraft, all_aircraft_times)
+    p = getTransferPassengerArray(arrivals, departures, num_aircraft)
+    return {i: dict(zip(all_aircraft, row)) for i, row in zip(all_aircraft, p.tolist())}
 
-            aj, dj = all_aircraft_times[j]
+def getTimeArrays(all_aircraft:list, all_aircraft_times:dict) -> tuple[np.ndarray, np.ndarray]:
+    '''
+    returns arrival and departure times as arrays in the order of all_aircraft
+    '''
+    arrivals   = np.array([all_aircraft_times[ac][0] for ac in all_aircraft], dtype=float)
+    departures = np.array([all_aircraft_times[ac][1] for ac in all_aircraft], dtype=float)
+    return arrivals, departures
 
-            if ai < dj and aj < di:  # overlap
-                val = np.random.randint(1, int(200 / num_aircraft) + 1)
-                # val = np.random.randint(0, int(200) + 1)
-                p_ij[i][j] = val
-                # p_ij[j][i] = val  # enforce symmetry
-    return p_ij
+def getCompatabilityArray(arrivals:np.ndarray, departures:np.ndarray, distinct_times:list) -> np.ndarray:
+    '''
+    returns boolean n x T array of aircraft vs distinct time intervals, True if aircraft i is in the airport at interval [r,r+1)
+    '''
+    times = np.asarray(distinct_times, dtype=float)
+    return (arrivals[:, None] < times[None, 1:]) & (departures[:, None] > times[None, :-1])
 
 def getCompatabilityMatrix(all_aircraft_times:dict, distinct_times:list) -> Dict[str, List[int]]:
     '''
@@ -62,13 +90,51 @@ def getCompatabilityMatrix(all_aircraft_times:dict, distinct_times:list) -> Dict
     comp[i][r] = 1 if aircraft i is in the airport at interval [r,r+1)
                  0 otherwise
     '''
-    comp_ir = {}
-    for ac, (a, d) in all_aircraft_times.items():
-        comp_ir[ac] = []
-        for r in range(len(distinct_times)-1):
-            start, end = distinct_times[r], distinct_times[r+1]
-            comp_ir[ac].append(1 if (a < end and d > start) else 0)
-    return comp_ir
+    aircraft = list(all_aircraft_times)
+    arrivals, departures = getTimeArrays(aircraft, all_aircraft_times)
+    comp = getCompatabilityArray(arrivals, departures, distinct_times).astype(int)
+    return dict(zip(aircraft, comp.reshape(len(aircraft), max(len(distinct_times) - 1, 0)).tolist()))
+
+def getMaximalCliques(aircraft_times:dict) -> List[List[str]]:
+    '''
+    returns the maximal cliques of the interval graph of the aircraft, the largest sets of aircraft that are on the ground together.
+    Sweep over the sorted arrival and departure times, departures before arrivals at the same time because touching
+    intervals do not overlap. The active set is a maximal clique whenever an aircraft leaves after one has arrived.
+    '''
+    events = []
+    for ac, (a, d) in aircraft_times.items():
+        events.append((a, 1, ac))
+        events.append((d, 0, ac))
+    events.sort(key=lambda event: (event[0], event[1]))
+
+    order   = {ac: idx for idx, ac in enumerate(aircraft_times)}
+    cliques = []
+    active  = set()
+    grown   = False
+    for t, is_arrival, ac in events:
+        if is_arrival:
+            active.add(ac)
+            grown = True
+        else:
+            if grown:
+                cliques.append(sorted(active, key=order.get))
+                grown = False
+            active.remove(ac)
+    return cliques
+
+def getOverlappingPairs(aircraft_times:dict) -> List[tuple[str, str]]:
+    '''
+    returns all pairs of aircraft that are on the ground at the same time
+    '''
+    aircraft = list(aircraft_times)
+    pairs = []
+    for idx_i, i in enumerate(aircraft):
+        ai, di = aircraft_times[i]
+        for j in aircraft[idx_i + 1:]:
+            aj, dj = aircraft_times[j]
+            if ai < dj and aj < di:
+                pairs.append((i, j))
+    return pairs
 
 def getGateCoords(dom_gates:list, int_gates:list) -> Dict[str, tuple[int, int]]:
     '''
@@ -124,31 +190,76 @@ def getGateCoords(dom_gates:list, int_gates:list) -> Dict[str, tuple[int, int]]:
     gate_coords['apron'] = (0,30) # overwrite with some set value that's far away
     return gate_coords
 
+def getGateDistanceArrays(entrance_coords:tuple, gate_coords:dict, gates:list) -> tuple[np.ndarray, np.ndarray]:
+    '''
+    returns d, the g x g array of manhattan distances between the gates
+            ed, the distance between every gate and the entrance
+    '''
+    coords = np.array([gate_coords[k] for k in gates], dtype=float).reshape(len(gates), 2)
+    d  = np.abs(coords[:, None, :] - coords[None, :, :]).sum(axis=2)
+    ed = np.abs(coords - np.asarray(entrance_coords, dtype=float)).sum(axis=1)
+    return d, ed
+
 def getGateDistances(entrance_coords:tuple, gate_coords:dict, all_gates:set) -> tuple[Dict[str, Dict[str, int]], Dict[str, int]]:
     '''
     returns d_kl, the dict with distances between gates k and l
             ed_k, the distance between gate k and the entrance
     '''
-    d_kl = {}
-    ed_k = {}
-    for k in all_gates:
-        d_kl[k] = {}
-        xk, yk = gate_coords[k]
-        ed_k[k] = abs(xk - entrance_coords[0]) + abs(yk - entrance_coords[1])
-        for l in all_gates:
-            if k == l:
-                d_kl[k][l] = 0.0
-                continue
-
-            xl, yl = gate_coords[l]
-            
-            d_kl[k][l] = abs(xk - xl) + abs(yk - yl)
+    gates = list(all_gates)
+    d, ed = getGateDistanceArrays(entrance_coords, gate_coords, gates)
+    d_kl = {k: dict(zip(gates, row)) for k, row in zip(gates, d.tolist())}
+    ed_k = dict(zip(gates, ed.tolist()))
     return d_kl, ed_k
 
-def getArrivalDepartureTimes(aircraft:list, window:tuple, time_discretization:float = 0.0166, tat_input:float = 0) -> Dict[str, tuple[int, int]]:
+class InstanceArrays:
+    """
+    Array-backed instance data. Aircraft and gates are numbered by ac_index and gate_index,
+    p is the n x n transfer array, comp the n x T boolean aircraft vs interval array,
+    d the g x g gate distance array and ed the gate to entrance distances.
+    The dict views give the dict-of-dict structures the model builders use.
+    """
+
+    def __init__(self, aircraft:list, gates:list, arrivals:np.ndarray, departures:np.ndarray, ac_type:np.ndarray,
+                 p:np.ndarray, comp:np.ndarray, d:np.ndarray, ed:np.ndarray, e:np.ndarray, f:np.ndarray):
+        self.aircraft   = list(aircraft)
+        self.gates      = list(gates)
+        self.ac_index   = {ac: i for i, ac in enumerate(self.aircraft)}
+        self.gate_index = {k: i for i, k in enumerate(self.gates)}
+        self.arrivals   = arrivals
+        self.departures = departures
+        self.ac_type    = ac_type
+        self.p          = p
+        self.comp       = comp
+        self.d          = d
+        self.ed         = ed
+        self.e          = e
+        self.f          = f
+
+    def p_ij_dict(self) -> Dict[str, Dict[str, int]]:
+        return {i: dict(zip(self.aircraft, row)) for i, row in zip(self.aircraft, self.p.tolist())}
+
+    def comp_ir_dict(self) -> Dict[str, List[int]]:
+        return dict(zip(self.aircraft, self.comp.astype(int).tolist()))
+
+    def d_kl_dict(self) -> Dict[str, Dict[str, float]]:
+        return {k: dict(zip(self.gates, row)) for k, row in zip(self.gates, self.d.tolist())}
+
+    def ed_k_dict(self) -> Dict[str, float]:
+        return dict(zip(self.gates, self.ed.tolist()))
+
+    def e_i_dict(self) -> Dict[str, int]:
+        return dict(zip(self.aircraft, self.e.tolist()))
+
+    def f_i_dict(self) -> Dict[str, int]:
+        return dict(zip(self.aircraft, self.f.tolist()))
+
+def getArrivalDepartureTimes(aircraft:list, window:tuple, time_discretization:float = 0.0166, tat_input:float = 0,
+                             crn_seed:int = None, opening_hours:tuple = (6, 22)) -> Dict[str, tuple[int, int]]:
     '''
     returns dict with {ac: (arrivaltime, departuretime), ...} in hours
     time_disc default is in minutes    
+    With a crn_seed, the arrival and tat of every aircraft come from their own streams instead of the global one
+    window 'day' spreads the arrivals over the opening_hours (open, close) of a full operating day
     '''
     times = {}
 
@@ -161,6 +272,10 @@ def getArrivalDepartureTimes(aircraft:list, window:tuple, time_discretization:fl
         open,close = 13,15.5
         tat_base = 1.0 if tat_input == 0 else tat_input
 
+    elif window=='day':
+        open, close = opening_hours
+        tat_base = 0.5 if tat_input == 0 else tat_input
+
     else:
         print('\n\nIncorrect window!\n\n')
         print(window)
@@ -172,9 +287,14 @@ def getArrivalDepartureTimes(aircraft:list, window:tuple, time_discretization:fl
 
     for ac in aircraft:
 
-        arrival = np.random.choice(possible_times)
-        # tat     = 0.5 + np.random.choice(np.arange(0,0.5+step,step))
-        tat     = tat_base + np.random.choice(tat_variance)
+        if crn_seed is not None:
+            key     = aircraftKey(ac)
+            arrival = possible_times[uniformIndex(componentUniform(crn_seed, 'arrival', *key), len(possible_times))]
+            tat     = tat_base + tat_variance[uniformIndex(componentUniform(crn_seed, 'tat', *key), len(tat_variance))]
+        else:
+            arrival = np.random.choice(possible_times)
+            # tat     = 0.5 + np.random.choice(np.arange(0,0.5+step,step))
+            tat     = tat_base + np.random.choice(tat_variance)
 
         departure = arrival + tat 
         times[ac] = (arrival, departure)
@@ -1,13 +1,26 @@
 
+import os
 import numpy as np
 from gurobipy import GRB
 import time
-import math
+from concurrent.futures import ThreadPoolExecutor
 
-from GateModel.BuildModel import BuildGateModel
+from GateModel.BuildModel import BuildGateModel, BUILD_PHASES
+from GateModel.BuildModelMatrix import BuildGateModelMatrix
 from GateModel.apronMinimization   import findMinApron
-from GateModel.ConstructParameters import getAircraft, getGates, getTransferPassengers, getCompatabilityMatrix, getGateCoords, getGateDistances, getArrivalDepartureTimes
+from GateModel.ConstructParameters import getAircraft, getGates, getGateCoords, getArrivalDepartureTimes
+from GateModel.ConstructParameters import getTimeArrays, getTransferPassengerArray, getCompatabilityArray, getGateDistanceArrays, InstanceArrays
 from GateModel.plotGateAssignments import plot_timetable_broken
+from GateModel.instanceCache import InstanceCache
+from GateModel.warmStart import greedyAssignment, assignmentObjective, restrictAssignment
+from GateModel.localSearch import simulatedAnnealing
+from GateModel.modelPool import ModelPool
+from GateModel.progressRecorder import ProgressRecorder, timeToGap, primalIntegral, relativeGap
+from GateModel.termination import TerminationMonitor, terminationReason
+from GateModel.randomStreams import checkRngMode, componentStream, aircraftKey
+from GateModel.presolve import getComponents, fixIsolatedAircraft, countModelVars
+from GateModel.gurobiEnv import newEnv
+from GateModel.rollingHorizon import checkHorizon, sliceStarts, releaseTimes, placeOnFreeGates
 
 class GateAssignmentProblem:
     """Single gate assignment problem instance"""
@@ -22,19 +35,77 @@ class GateAssignmentProblem:
         'airport_window': 'set1', 
         'time_disc': 0.1666,
         'seed': 1,
-        'passenger_type': 'paper'
+        'passenger_type': 'paper',
+        'apron_engine': 'greedy',
+        'rng': 'legacy',
+        'family_size': None,
+        'opening_hours': (6, 22)
     }
 
-    def __init__(self, **kwargs):
-        """Initialize problem with configuration parameters."""
+ 
+    # Everything generate_problem_data creates, stored in the instance cache
+    INSTANCE_ATTRIBUTES = ['dom_aircraft', 'dom_gates', 'int_aircraft', 'int_gates', 'all_gates', 'all_aircraft', 'num_aircraft',
+                           'dom_aircraft_times', 'int_aircraft_times', 'all_aircraft_times', 'distinct_times', 'comp_ir',
+                           'NA_star', 'dom_gate_paths', 'int_gate_paths', 'p_ij', 'nt_i', 'e_i', 'f_i', 'total_passengers',
+                           'g', 'gates_available_per_ac', 'gate_coords', 'd_kl', 'ed_k', 'arrays', 'generation_times']
+
+    # Passenger types whose instances with a family_size are nested. 'equal' sets the local passengers of an aircraft
+    # to its transfers within the instance, so leaving out an aircraft changes the passengers of the others.
+    NESTED_PASSENGER_TYPES = ['paper', 'no_transfer', 'only_transfer']
+
+    # Per phase timings and model size counters in the results of solve, None where a phase did not run
+    PHASE_TIMES = ['data_time', 'apron_time'] + [f'{phase}_time' for phase in BUILD_PHASES] + ['optimize_time', 'extract_time']
+    COUNTERS    = ['num_vars', 'num_constrs', 'num_nzs', 'node_count', 'iter_count', 'root_bound', 'lazy_rows', 'lazy_cuts']
+
+    def __init__(self, cache:InstanceCache=None, **kwargs):
+        """
+        Initialize problem with configuration parameters.
+        If an InstanceCache is given, the problem data and solve results are looked up there first.
+        rng='legacy' draws everything from the global np.random stream seeded with seed, as the original code did.
+        rng='crn' gives the arrival time, tat, transfers and local passengers of every aircraft their own stream keyed
+        on seed and the aircraft, so configurations with the same seed share their random numbers (common random numbers)
+        and changing the turnover time or the number of aircraft does not reshuffle the other aircraft.
+        With rng='crn' and a family_size, the range of the transfer draws is scaled on family_size aircraft instead of
+        on the aircraft of this instance, so all instances up to family_size aircraft form a nested family:
+        the instance with n-1 aircraft is the instance with n aircraft without its last aircraft.
+        """
         self.config = {**self.DEFAULT_CONFIG, **kwargs}
-        np.random.seed(self.config['seed'])
-        self.generate_problem_data()
+        self.cache  = cache
+        checkRngMode(self.config['rng'])
+        family_size = self.config['family_size']
+        if family_size is not None:
+            if self.config['rng'] != 'crn':
+                raise ValueError("A family_size needs rng='crn', the legacy stream is not nested")
+            if family_size < self.config['num_dom_aircraft'] + self.config['num_int_aircraft']:
+                raise ValueError(f'family_size {family_size} is smaller than the number of aircraft')
+            if self.config['passenger_type'] not in self.NESTED_PASSENGER_TYPES:
+                raise ValueError(f"passenger_type {self.config['passenger_type']} does not give nested instances")
+
+        cached = None
+        if self.cache is not None:
+            t_lookup_start = time.time()
+            instance_key = self.cache.key('instance', self.config)
+            cached = self.cache.get(instance_key)
+
+        if cached is not None:
+            self.__dict__.update(cached)
+            # Nothing was generated in this run, only the cache lookup took time
+            self.generation_times = {'data_time': time.time() - t_lookup_start, 'apron_time': 0.0}
+        else:
+            np.random.seed(self.config['seed'])
+            self.generate_problem_data()
+            if self.cache is not None:
+                self.cache.put(instance_key, {attr: getattr(self, attr) for attr in self.INSTANCE_ATTRIBUTES})
     
 
     def generate_problem_data(self):
-        """Generate all problem parameters from configuration."""
+        """
+        Generate all problem parameters from configuration.
+        The time spent on findMinApron and on everything else is stored in generation_times.
+        """
         cfg = self.config
+        t_data_start = time.time()
+        crn_seed = cfg['seed'] if cfg['rng'] == 'crn' else None
         
         # Generate aircraft and gates
         self.dom_aircraft = getAircraft(num=cfg['num_dom_aircraft'], ac_type='dom')
@@ -48,22 +119,29 @@ class GateAssignmentProblem:
         self.num_aircraft = len(self.all_aircraft)
         
         # Generate temporal parameters
-        self.dom_aircraft_times = getArrivalDepartureTimes(self.dom_aircraft, cfg['airport_window'], cfg['time_disc'],cfg['dom_turnover'])
-        self.int_aircraft_times = getArrivalDepartureTimes(self.int_aircraft, cfg['airport_window'], cfg['time_disc'],cfg['int_turnover'])
+        self.dom_aircraft_times = getArrivalDepartureTimes(self.dom_aircraft, cfg['airport_window'], cfg['time_disc'],cfg['dom_turnover'], crn_seed,
+                                                           cfg['opening_hours'])
+        self.int_aircraft_times = getArrivalDepartureTimes(self.int_aircraft, cfg['airport_window'], cfg['time_disc'],cfg['int_turnover'], crn_seed,
+                                                           cfg['opening_hours'])
         self.all_aircraft_times = self.dom_aircraft_times | self.int_aircraft_times
         
         all_times = [t for times in self.all_aircraft_times.values() for t in times]
         self.distinct_times = sorted(set(all_times))
-        self.comp_ir = getCompatabilityMatrix(self.all_aircraft_times, self.distinct_times)
+        arrivals, departures = getTimeArrays(self.all_aircraft, self.all_aircraft_times)
+        comp = getCompatabilityArray(arrivals, departures, self.distinct_times)
         
         # print(f'All times: {all_times}')
         # print(f'Distinct times: {self.distinct_times}')
 
-        # Calculate minimum apron requirement
-        self.NA_star = findMinApron(self.dom_aircraft_times, self.int_aircraft_times, self.dom_gates, self.int_gates)
+        # Calculate minimum apron requirement, and the gate sequences that achieve it
+        t_apron_start = time.time()
+        self.NA_star, self.dom_gate_paths, self.int_gate_paths = findMinApron(self.dom_aircraft_times, self.int_aircraft_times,
+                                                                              self.dom_gates, self.int_gates,
+                                                                              engine=cfg['apron_engine'], return_schedules=True)
+        t_apron = time.time() - t_apron_start
         
         # Generate passenger data
-        self.generate_passenger_data()
+        p, e, f = self.generate_passenger_data(arrivals, departures, crn_seed)
 
         # Generate gate compatibility and distances
         self.g = {**{ac: 0 for ac in self.dom_aircraft}, **{ac: 1 for ac in self.int_aircraft}        }
@@ -71,68 +149,342 @@ class GateAssignmentProblem:
                                        for ac in self.all_aircraft}
         
         entrance_coords = (0, 0)
+        gates = list(dict.fromkeys(self.dom_gates + self.int_gates))
         self.gate_coords = getGateCoords(self.dom_gates, self.int_gates)
-        self.d_kl, self.ed_k = getGateDistances(entrance_coords, self.gate_coords, self.all_gates)
+        d, ed = getGateDistanceArrays(entrance_coords, self.gate_coords, gates)
+
+        # Array-backed instance, the dicts below are views of it for the model builders
+        ac_type = np.array([self.g[ac] for ac in self.all_aircraft], dtype=np.int64)
+        self.arrays = InstanceArrays(self.all_aircraft, gates, arrivals, departures, ac_type, p, comp, d, ed, e, f)
+        self.p_ij    = self.arrays.p_ij_dict()
+        self.e_i     = self.arrays.e_i_dict()
+        self.f_i     = self.arrays.f_i_dict()
+        self.comp_ir = self.arrays.comp_ir_dict()
+        self.d_kl    = self.arrays.d_kl_dict()
+        self.ed_k    = self.arrays.ed_k_dict()
+
+        self.generation_times = {'data_time': time.time() - t_data_start - t_apron, 'apron_time': t_apron}
    
 
-    def generate_passenger_data(self):
+    def generate_passenger_data(self, arrivals, departures, crn_seed=None):
+        """
+        Returns the transfer array p and local passenger arrays e and f for the passenger_type,
+        each drawn in one batch in the same order as the original per-aircraft draws.
+        With a crn_seed the draws come from the per aircraft streams of randomStreams instead.
+        """
         passenger_type = self.config['passenger_type']
+        n = self.num_aircraft
+        n_scale = self.config['family_size'] or n # aircraft count the number of transfers per pair is scaled on
+
+        # Two uniforms per aircraft for the local passengers: the total nt and the share e of it
+        if crn_seed is not None:
+            local_u = np.array([componentStream(crn_seed, 'local', *aircraftKey(ac)).random(2) for ac in self.all_aircraft]).reshape(n, 2)
+
+        def drawTotal():
+            '''Total local passengers nt in [1, 100] of every aircraft'''
+            if crn_seed is None:
+                return np.random.randint(1, 101, size=n)
+            return 1 + np.minimum((local_u[:, 0] * 100).astype(np.int64), 99)
+
+        def drawLocal(high, selected=slice(None)):
+            '''Local passengers e in [0, high) of the selected aircraft'''
+            if crn_seed is None:
+                return np.random.randint(0, high)
+            return np.minimum((local_u[selected, 1] * high).astype(np.int64), high - 1)
 
         if passenger_type == 'paper': # Default, as described in the paper
-            self.p_ij = getTransferPassengers(self.all_aircraft, self.num_aircraft, self.all_aircraft_times)
-            self.nt_i = {i: np.random.randint(1, 101) for i in self.all_aircraft}
-            self.e_i  = {i: np.random.randint(0, self.nt_i[i] + 1) for i in self.all_aircraft}
-            self.f_i  = {i: self.nt_i[i] - self.e_i[i] for i in self.all_aircraft}
+            p  = getTransferPassengerArray(arrivals, departures, n_scale, crn_seed, self.all_aircraft)
+            nt = drawTotal()
+            e  = drawLocal(nt + 1)
                         
         elif passenger_type == 'no_transfer':
-            self.p_ij = {i: {j: 0 for j in self.all_aircraft} for i in self.all_aircraft} 
-            self.nt_i = {i: np.random.randint(1, 101) for i in self.all_aircraft}
-            self.e_i  = {i: np.random.randint(0, self.nt_i[i] + 1) for i in self.all_aircraft}
-            self.f_i  = {i: self.nt_i[i] - self.e_i[i] for i in self.all_aircraft}
+            p  = np.zeros((n, n), dtype=np.int64)
+            nt = drawTotal()
+            e  = drawLocal(nt + 1)
 
         elif passenger_type == 'only_transfer':            
-            self.p_ij = getTransferPassengers(self.all_aircraft, self.num_aircraft, self.all_aircraft_times)
-            self.nt_i = {i: 0 for i in self.all_aircraft}
-            self.e_i  = {i: 0 for i in self.all_aircraft}
-            self.f_i  = {i: 0 for i in self.all_aircraft}
+            p  = getTransferPassengerArray(arrivals, departures, n_scale, crn_seed, self.all_aircraft)
+            nt = np.zeros(n, dtype=np.int64)
+            e  = np.zeros(n, dtype=np.int64)
 
         elif passenger_type == 'equal':
-            self.p_ij = getTransferPassengers(self.all_aircraft, self.num_aircraft, self.all_aircraft_times)
-            self.nt_i = {i: sum(self.p_ij[i][j] for j in self.all_aircraft) for i in self.all_aircraft}
-            self.e_i  = {i: np.random.randint(0,self.nt_i[i]) if self.nt_i[i] > 0 else 0 for i in self.all_aircraft}
-            self.f_i  = {i: self.nt_i[i] - self.e_i[i] for i in self.all_aircraft}
+            p  = getTransferPassengerArray(arrivals, departures, n_scale, crn_seed, self.all_aircraft)
+            nt = p.sum(axis=1)
+            e  = np.zeros(n, dtype=np.int64)
+            e[nt > 0] = drawLocal(nt[nt > 0], nt > 0)
+
+        else:
+            raise ValueError(f'Unknown passenger_type {passenger_type}')
+
+        f = nt - e
+        self.nt_i = dict(zip(self.all_aircraft, nt.tolist()))
+        self.total_passengers = int(nt.sum() + p.sum())
+
+        return p, e, f
+
+    def subproblem(self, aircraft:list) -> 'GateAssignmentProblem':
+        """
+        The instance restricted to aircraft, with the same gates, passengers and config and its own NA_star and gate paths.
+        Used by the presolve to solve the components of the instance separately, it is not cached.
+        """
+        t_data_start = time.time()
+        sub = GateAssignmentProblem.__new__(GateAssignmentProblem)
+        sub.config, sub.cache = self.config, None
+
+        keep = set(aircraft)
+        sub.dom_aircraft = [ac for ac in self.dom_aircraft if ac in keep]
+        sub.int_aircraft = [ac for ac in self.int_aircraft if ac in keep]
+        sub.dom_gates, sub.int_gates, sub.all_gates = self.dom_gates, self.int_gates, self.all_gates
+        sub.all_aircraft = sub.dom_aircraft + sub.int_aircraft
+        sub.num_aircraft = len(sub.all_aircraft)
+
+        sub.dom_aircraft_times = {ac: self.dom_aircraft_times[ac] for ac in sub.dom_aircraft}
+        sub.int_aircraft_times = {ac: self.int_aircraft_times[ac] for ac in sub.int_aircraft}
+        sub.all_aircraft_times = sub.dom_aircraft_times | sub.int_aircraft_times
+        sub.distinct_times = sorted(set(t for times in sub.all_aircraft_times.values() for t in times))
+        arrivals, departures = getTimeArrays(sub.all_aircraft, sub.all_aircraft_times)
+        comp = getCompatabilityArray(arrivals, departures, sub.distinct_times)
+
+        t_apron_start = time.time()
+        sub.NA_star, sub.dom_gate_paths, sub.int_gate_paths = findMinApron(sub.dom_aircraft_times, sub.int_aircraft_times,
+                                                                           sub.dom_gates, sub.int_gates,
+                                                                           engine=self.config['apron_engine'], return_schedules=True)
+        t_apron = time.time() - t_apron_start
+
+        sub.g = {ac: self.g[ac] for ac in sub.all_aircraft}
+        sub.gates_available_per_ac = {ac: self.gates_available_per_ac[ac] for ac in sub.all_aircraft}
+        sub.gate_coords = self.gate_coords
+
+        idx = np.array([self.arrays.ac_index[ac] for ac in sub.all_aircraft], dtype=np.int64)
+        arrays = self.arrays
+        sub.arrays = InstanceArrays(sub.all_aircraft, arrays.gates, arrivals, departures, arrays.ac_type[idx],
+                                    arrays.p[np.ix_(idx, idx)], comp, arrays.d, arrays.ed, arrays.e[idx], arrays.f[idx])
+        sub.p_ij    = sub.arrays.p_ij_dict()
+        sub.e_i     = sub.arrays.e_i_dict()
+        sub.f_i     = sub.arrays.f_i_dict()
+        sub.comp_ir = sub.arrays.comp_ir_dict()
+        sub.d_kl    = self.d_kl
+        sub.ed_k    = self.ed_k
+
+        sub.nt_i = {ac: self.nt_i[ac] for ac in sub.all_aircraft}
+        sub.total_passengers = int(sum(sub.nt_i.values()) + sub.arrays.p.sum())
+        sub.generation_times = {'data_time': time.time() - t_data_start - t_apron, 'apron_time': t_apron}
+        return sub
+
+
+    BUILDERS = {'loop': BuildGateModel, 'matrix': BuildGateModelMatrix}
+    ENGINES  = ['mip', 'local_search', 'compare', 'rolling']
+
+    def solve(self, time_limit=3600, verbose=False, plot_timetable_flag=None, sparse=False, builder='loop', named=True,
+              threads=None, use_cache=True, no_overlap='interval', warm_start=False, engine='mip', formulation='linearized',
+              model_pool:ModelPool=None, keep_model=False, model_file=None,
+              trace_interval=0.5, termination=None, start_assignment=None, presolve=False, split_types=False, horizon=None,
+              heuristic_time_limit=None):
+        """
+        Solve the gate assignment problem.
+        If sparse, only aircraft pairs with transfers get y-variables.
+        builder selects BuildGateModel ('loop') or the matrix API version BuildGateModelMatrix ('matrix'),
+        named=False leaves the variables and constraints of the matrix builder unnamed.
+        threads sets the Gurobi Threads parameter, by default Gurobi decides.
+        If the problem has a cache, an identical earlier solve is returned from it, use_cache=False bypasses the cache.
+        no_overlap selects the formulation of constraint (3): 'interval', 'clique', 'pairwise' or 'auto'.
+        If warm_start, the greedy assignment of warmStart.greedyAssignment is given to Gurobi as MIP start.
+        engine selects the exact MIP ('mip'), simulated annealing from the greedy assignment ('local_search'),
+        or both ('compare'), which returns the MIP results with the heuristic objective and its gap to the MIP added.
+        In compare mode the heuristic gets heuristic_time_limit seconds, by default the time the MIP took.
+        Simulated annealing also stops early once it stops improving, see localSearch.simulatedAnnealing.
+        engine 'rolling' solves overlapping time slices one after the other, for full days (window 'day'), see solve_rolling.
+        horizon sets its slice length and overlap in hours and the number of workers, see rollingHorizon.DEFAULT_HORIZON.
+        formulation='quadratic' builds only the x-variables with the transfer cost as quadratic objective,
+        instead of the y-variables and linearization constraints (6) of the paper ('linearized').
+        formulation='lazy' builds the y-variables without constraints (6) and adds the rows (6) an incumbent or node LP
+        violates in the MIP callback, results['lazy_rows'] counts the distinct rows added and results['lazy_cuts'] all additions.
+        formulation='rlt' replaces constraints (6) by the tighter aggregated equalities of the RLT linearization.
+        results['root_bound'] is the bound at the end of the root node, to compare the strength of the formulations.
+        With a model_pool, a model built earlier for an instance with the same structure is updated to the passenger
+        numbers and NA_star of this instance and re-optimized from its previous solution, instead of building a new one.
+        The results only hold plain data: the model is disposed after extracting the results unless keep_model,
+        and it is written to model_file first if given (any file type Model.write supports, e.g. .lp, .mps or .sol).
+        A model from the model_pool is never disposed here, the pool owns it.
+        keep_model and model_file need a single MIP and raise a ValueError with presolve, split_types or a heuristic engine,
+        a model_pool is used with presolve but raises one with split_types or a heuristic engine.
+        The solver progress is recorded in results['trace'] at most every trace_interval seconds and whenever the
+        incumbent or bound changes, with time_to_first_incumbent, time_to_1pct_gap and primal_integral derived from it.
+        termination holds early termination criteria on top of time_limit, e.g. {'gap': 0.01, 'stagnation': 60},
+        see termination.TerminationMonitor. Why the solve stopped is given by results['termination_reason'].
+        start_assignment {ac: gate} is given to Gurobi as MIP start instead of the greedy assignment, e.g. the solution of
+        a neighbouring instance. It is restricted to the aircraft and gates of this instance and repaired to NA_star first.
+        With presolve, aircraft that overlap with no other aircraft are fixed to the closest gate and the remaining
+        connected components of aircraft are solved as separate MIPs, see solve_presolved.
+        With split_types, the domestic and international aircraft are solved as two MIPs at the same time, see solve_split.
+        """
+        if engine not in self.ENGINES:
+            raise ValueError(f'Unknown engine {engine}, choose from {self.ENGINES}')
+
+        # keep_model and model_file need the one model of a plain MIP solve, a model_pool needs the MIPs to be built
+        # in the shared environment of this thread
+        split = split_types and self.dom_aircraft and self.int_aircraft
+        heuristic = engine in ('local_search', 'rolling')
+        unsupported = [name for name, value, supported in (('keep_model', keep_model, not (heuristic or split or presolve)),
+                                                           ('model_file', model_file, not (heuristic or split or presolve)),
+                                                           ('model_pool', model_pool, not (heuristic or split)))
+                       if value and not supported]
+        if unsupported:
+            raise ValueError(f'Not supported with engine={engine!r}, presolve={presolve}, split_types={split_types}: {unsupported}')
+
+        solve_key = None
+        if self.cache is not None and use_cache:
+            solve_key = self.cache.key('solve', self.config, time_limit=time_limit, sparse=sparse, builder=builder,
+                                       named=named, threads=threads, no_overlap=no_overlap, warm_start=warm_start,
+                                       engine=engine, formulation=formulation, termination=termination,
+                                       start_assignment=start_assignment, presolve=presolve, split_types=split_types,
+                                       horizon=horizon, heuristic_time_limit=heuristic_time_limit)
+            results = self.cache.get(solve_key)
+            if results is not None:
+                results['cached'] = True
+                if plot_timetable_flag:
+                    self.plot_timetable(results)
+                return results
+
+        if engine == 'local_search':
+            results = self.solve_local_search(time_limit)
+        elif engine == 'rolling':
+            results = self.solve_rolling(time_limit, horizon, verbose=verbose, sparse=sparse, builder=builder, named=named,
+                                         threads=threads, no_overlap=no_overlap, warm_start=warm_start, formulation=formulation,
+                                         trace_interval=trace_interval, termination=termination)
+        elif split:
+            results = self.solve_split(time_limit, presolve=presolve, verbose=verbose, sparse=sparse, builder=builder, named=named,
+                                       threads=threads, no_overlap=no_overlap, warm_start=warm_start, formulation=formulation,
+                                       trace_interval=trace_interval, termination=termination, start_assignment=start_assignment)
+        elif presolve:
+            results = self.solve_presolved(time_limit, verbose=verbose, sparse=sparse, builder=builder, named=named,
+                                           threads=threads, no_overlap=no_overlap, warm_start=warm_start, formulation=formulation,
+                                           model_pool=model_pool, trace_interval=trace_interval, termination=termination,
+                                           start_assignment=start_assignment)
+        else:
+            results = self.solve_mip(time_limit, verbose, sparse, builder, named, threads, no_overlap, warm_start, formulation,
+                                     model_pool, keep_model, model_file, trace_interval, termination, start_assignment)
+
+        if engine == 'compare':
+            heuristic = self.solve_local_search(heuristic_time_limit if heuristic_time_limit is not None else results['total_time'])
+            results['heuristic_objective'] = heuristic['objective']
+            results['heuristic_time'] = heuristic['total_time']
+            results['heuristic_gap'] = None
+            if results['objective']:
+                results['heuristic_gap'] = (heuristic['objective'] - results['objective']) / abs(results['objective'])
 
-        self.total_passengers = sum(self.nt_i[i] + sum(self.p_ij[i][j] for j in self.all_aircraft) for i in self.all_aircraft)
+        x_solution = results['x_solution']
+        # print(f'x_solution: {x_solution}')
+        # print([f'x_solution[{ac}]: {x_solution[ac][1]}' for ac in self.dom_aircraft])
+
+        if x_solution:
+            for k in [g for g in self.dom_gates if g != 'apron']:
+                for r in range(len(self.distinct_times) - 1):
+                    overlap_sum = sum(self.comp_ir[ac][r] * x_solution[ac][1] for ac in self.dom_aircraft if x_solution[ac][0] == k)
+                    # print(f'overlap_sum: {overlap_sum}')
+                    if overlap_sum > 1:
+                        print(f"VIOLATION at gate {k}, interval {r}: {overlap_sum} aircraft")
+
+        # print('passed test')
+
+        if solve_key is not None:
+            self.cache.put(solve_key, {**results, 'model': None})
+        results['cached'] = False
 
+        if plot_timetable_flag:
+            self.plot_timetable(results)
+    
+        return results
 
-    def solve(self, time_limit=3600, verbose=False, plot_timetable_flag=None):
-        """Solve the gate assignment problem."""
+    def solve_mip(self, time_limit, verbose, sparse, builder, named, threads, no_overlap, warm_start, formulation,
+                  model_pool=None, keep_model=False, model_file=None, trace_interval=0.5, termination=None,
+                  start_assignment=None, env=None, fixed_assignment=None):
+        """
+        Build and optimize the MIP, see solve for the options. The model is built in env if given, else in getEnv().
+        The aircraft of fixed_assignment {ac: gate} are fixed to their gate through the bounds of their x-variables.
+        """
+        if builder not in self.BUILDERS:
+            raise ValueError(f'Unknown builder {builder}, choose from {list(self.BUILDERS)}')
+        build_options = {'sparse': sparse, 'no_overlap': no_overlap, 'all_aircraft_times': self.all_aircraft_times,
+                         'formulation': formulation}
+        if builder == 'matrix':
+            build_options['named'] = named
+        if env is not None:
+            build_options['env'] = env
         
                 # Build model
         t_build_start = time.time()
-        model, x, y = BuildGateModel(
-            self.num_aircraft, self.all_aircraft, self.g, self.gates_available_per_ac,
-            self.p_ij, self.e_i, self.f_i, self.d_kl, self.ed_k, 
-            self.dom_gates, self.dom_aircraft, self.int_gates, self.int_aircraft,
-            self.distinct_times, self.comp_ir, self.NA_star
-        )
+        model_reused = False
+        if model_pool is not None:
+            handle, model_reused = model_pool.get(self, builder, self.BUILDERS[builder], build_options)
+            model, x, y = handle.model, handle.x, handle.y
+        else:
+            model, x, y = self.BUILDERS[builder](
+                self.num_aircraft, self.all_aircraft, self.g, self.gates_available_per_ac,
+                self.p_ij, self.e_i, self.f_i, self.d_kl, self.ed_k, 
+                self.dom_gates, self.dom_aircraft, self.int_gates, self.int_aircraft,
+                self.distinct_times, self.comp_ir, self.NA_star, **build_options
+            )
         t_build = time.time() - t_build_start
+
+        # Given assignment, or else the constructive heuristic, as MIP start
+        warm_start_objective = None
+        t_warm_start = 0.0
+        start = None
+        if start_assignment is not None or warm_start:
+            t_warm_start_begin = time.time()
+            if start_assignment is not None:
+                start = restrictAssignment(self.arrays, start_assignment, self.dom_gates, self.int_gates, self.NA_star)
+            if start is None and warm_start:
+                start = greedyAssignment(self.arrays, self.dom_gates, self.int_gates, self.dom_gate_paths, self.int_gate_paths)
+        if start is not None:
+            for (ac, k), var in x.items():
+                var.Start = 1.0 if start[ac] == k else 0.0
+            for (i, j, k, l), var in y.items():
+                var.Start = 1.0 if start[self.all_aircraft[i]] == k and start[self.all_aircraft[j]] == l else 0.0
+            warm_start_objective = assignmentObjective(self.arrays, start)
+            t_warm_start = time.time() - t_warm_start_begin
         
+        if fixed_assignment:
+            for (ac, k), var in x.items():
+                if ac in fixed_assignment:
+                    var.LB = var.UB = 1.0 if fixed_assignment[ac] == k else 0.0
+
         # Configure solver
         model.Params.TimeLimit = time_limit
-        if not verbose:
-            model.Params.OutputFlag = 0
+        if threads is not None:
+            model.Params.Threads = threads
+        if verbose:
+            model.Params.OutputFlag = 1 # the shared environment has the output switched off
         
-        # Optimize with callback
-        iter_log = []
+        # Optimize with callback, recording the progress throttled to trace_interval seconds
+        recorder = ProgressRecorder(min_interval=trace_interval)
+        monitor  = TerminationMonitor(**(termination or {}))
+        first_incumbent = {}
+        root = {}
+        lazy = model._lazy
+        if lazy is not None:
+            lazy.reset()
         def mip_callback(m, where):
-            if where == GRB.Callback.MIP:
-                iters = m.cbGet(GRB.Callback.MIP_ITRCNT)
-                incumbent = m.cbGet(GRB.Callback.MIP_OBJBST)
-                bound = m.cbGet(GRB.Callback.MIP_OBJBND)
+            # A candidate that violates a lazy row is rejected, so it is not an incumbent
+            if lazy is not None and lazy.separate(m, where) and where == GRB.Callback.MIPSOL:
+                return
+
+            if where == GRB.Callback.MIPSOL:
                 runtime = m.cbGet(GRB.Callback.RUNTIME)
-                gap = math.inf if incumbent == 0 else abs(incumbent - bound) / abs(incumbent)
-                iter_log.append((iters, incumbent, bound, gap, runtime))
+                if 'time' not in first_incumbent:
+                    first_incumbent['time'] = runtime
+                incumbent = min(m.cbGet(GRB.Callback.MIPSOL_OBJ), m.cbGet(GRB.Callback.MIPSOL_OBJBST)) # OBJBST is the best before this solution
+                recorder.record(None, incumbent, m.cbGet(GRB.Callback.MIPSOL_OBJBND), runtime)
+
+            elif where == GRB.Callback.MIP:
+                incumbent, bound = m.cbGet(GRB.Callback.MIP_OBJBST), m.cbGet(GRB.Callback.MIP_OBJBND)
+                if m.cbGet(GRB.Callback.MIP_NODCNT) == 0:
+                    root['bound'] = bound # the last call at the root holds its final bound
+                runtime = m.cbGet(GRB.Callback.RUNTIME)
+                recorder.record(m.cbGet(GRB.Callback.MIP_ITRCNT), incumbent, bound, runtime)
+                if monitor.active() and monitor.check(incumbent, bound, runtime):
+                    m.terminate()
         
         t_solve_start = time.time()
         model.optimize(mip_callback)
@@ -142,34 +494,371 @@ class GateAssignmentProblem:
         # print(f"Objective: {model.objVal}")
         # print(f"Number of no-overlap constraints: {sum(1 for c in model.getConstrs() if 'no_overlap' in c.ConstrName)}")
 
+        if model.SolCount > 0 or model.Status == GRB.OPTIMAL:
+            recorder.finish(model.IterCount, model.ObjVal if model.SolCount > 0 else GRB.INFINITY, model.ObjBound, model.Runtime)
+
         # Extract results safely
-        results = self.extract_results(model, x, t_build, t_solve, iter_log)
+        t_extract_start = time.time()
+        results = self.extract_results(model, x, t_build, t_solve, recorder.as_tuples())
+        t_extract = time.time() - t_extract_start
 
-        x_solution = results['x_solution']
-        # print(f'x_solution: {x_solution}')
-        # print([f'x_solution[{ac}]: {x_solution[ac][1]}' for ac in self.dom_aircraft])
+        results['pruned_y_vars'] = model._pruned_y_vars
+        results['no_overlap'] = model._no_overlap
+        results['formulation'] = model._formulation
+        results['model_reused'] = model_reused
 
-        for k in [g for g in self.dom_gates if g != 'apron']:
-            for r in range(len(self.distinct_times) - 1):
-                overlap_sum = sum(self.comp_ir[ac][r] * x_solution[ac][1] for ac in self.dom_aircraft if x_solution[ac][0] == k)
-                # print(f'overlap_sum: {overlap_sum}')
-                if overlap_sum > 1:
-                    print(f"VIOLATION at gate {k}, interval {r}: {overlap_sum} aircraft")
+        # A reused model was only updated, its build phases did not run for this instance
+        results.update(self.generation_times)
+        results.update({f'{phase}_time': None if model_reused else model._build_times.get(phase) for phase in BUILD_PHASES})
+        results['optimize_time'] = t_solve
+        results['extract_time'] = t_extract
+        if model.Status == GRB.OPTIMAL and model.NodeCount <= 1:
+            root['bound'] = model.ObjBound # solved at the root, the callback may not have seen its final bound
+        results.update(num_vars=model.NumVars, num_constrs=model.NumConstrs, num_nzs=model.NumNZs,
+                       node_count=model.NodeCount, iter_count=model.IterCount, root_bound=root.get('bound'),
+                       lazy_rows=lazy.rows_added if lazy is not None else None, lazy_cuts=lazy.cuts if lazy is not None else None)
+        results['warm_start_objective'] = warm_start_objective
+        results['warm_start_time'] = t_warm_start
+        results['time_to_first_incumbent'] = first_incumbent.get('time')
+        results['termination_reason'] = terminationReason(model.Status, monitor)
+        results.update(self.trace_metrics(recorder.as_arrays(), results['objective'], model.Runtime))
 
-        # print('passed test')
+        if model_file:
+            model.write(model_file)
+        if not keep_model:
+            results['model'] = None
+            if model_pool is None:
+                model.dispose()
+        return results
 
-        if plot_timetable_flag:
-            self.plot_timetable(results)
-    
+    def solve_presolved(self, time_limit, sparse=False, **mip_options):
+        """
+        Solves the instance by parts, see presolve.getComponents: single aircraft components are fixed to their
+        closest gate and every other component is solved with solve_mip as a subproblem with its own NA_star,
+        one after the other within the shared time_limit. The partial solutions are stitched back into one results dict.
+        How much the presolve shrank the model is given by the PRESOLVE_STATS keys of the results.
+        """
+        t_presolve_start = time.time()
+        gates_per_type = {0: self.dom_gates, 1: self.int_gates}
+        components = getComponents(self.arrays)
+        fixed, components = fixIsolatedAircraft(self.arrays, components, gates_per_type)
+
+        full_x, full_y = countModelVars(self.arrays, gates_per_type, [list(range(self.num_aircraft))], sparse)
+        part_x, part_y = countModelVars(self.arrays, gates_per_type, components, sparse)
+        stats = {'presolve_components': len(components), 'presolve_fixed': len(fixed),
+                 'presolve_x_vars_removed': full_x - part_x, 'presolve_y_vars_removed': full_y - part_y}
+        subproblems = [self.subproblem([self.all_aircraft[i] for i in component]) for component in components]
+        t_presolve = time.time() - t_presolve_start
+
+        parts, offsets = [], []
+        for sub in subproblems:
+            used = sum(part['total_time'] for part in parts)
+            offsets.append(t_presolve + used)
+            parts.append(sub.solve_mip(max(time_limit - used, 0.0), sparse=sparse, **mip_options))
+
+        results = self.stitch_results(parts, offsets, fixed, t_presolve + sum(part['total_time'] for part in parts),
+                                      mip_options.get('formulation', 'linearized'))
+        results.update(presolve_time=t_presolve, **stats)
+        return results
+
+    def solve_split(self, time_limit, threads=None, presolve=False, **mip_options):
+        """
+        Solves the domestic and international aircraft as two subproblems in two threads, each with its own Gurobi
+        environment, and stitches the solutions together. The aircraft types use separate gates, so the halves only share
+        the apron count of constraint (4), which splits exactly into the NA_star of each half (findMinApron adds them up),
+        and the transfers between domestic and international aircraft. The split is therefore only exact without
+        such cross transfers, with them the joint model is solved instead (results['split_fallback']).
+        Without threads, each half gets half of the cores. With presolve, each half is solved with solve_presolved.
+        """
+        t_split_start = time.time()
+        arrays = self.arrays
+        dom_idx = np.array([arrays.ac_index[ac] for ac in self.dom_aircraft], dtype=np.int64)
+        int_idx = np.array([arrays.ac_index[ac] for ac in self.int_aircraft], dtype=np.int64)
+        if arrays.p[np.ix_(dom_idx, int_idx)].any() or arrays.p[np.ix_(int_idx, dom_idx)].any():
+            joint = self.solve_presolved if presolve else self.solve_mip
+            results = joint(time_limit, threads=threads, **mip_options)
+            results['split_fallback'] = True
+            return results
+
+        halves = [self.subproblem(self.dom_aircraft), self.subproblem(self.int_aircraft)]
+        half_threads = threads if threads is not None else max((os.cpu_count() or 2) // 2, 1)
+        t_split = time.time() - t_split_start
+
+        def solveHalf(sub):
+            env = newEnv()
+            try:
+                solve = sub.solve_presolved if presolve else sub.solve_mip
+                return solve(time_limit, threads=half_threads, env=env, **mip_options)
+            finally:
+                env.dispose()
+
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            parts = list(pool.map(solveHalf, halves))
+        total_time = time.time() - t_split_start
+
+        results = self.stitch_results(parts, [t_split, t_split], {}, total_time, mip_options.get('formulation', 'linearized'))
+        results['split_fallback'] = False
+        return results
+
+    def solve_rolling(self, time_limit, horizon=None, threads=None, **mip_options):
+        """
+        Rolling horizon heuristic for schedules that are too long for one MIP, such as a full day.
+        Aircraft that overlap with no other aircraft are fixed like in solve_presolved, the other connected components
+        are blocks that share no gates in time and are rolled in up to horizon['workers'] threads, each with its own
+        Gurobi environment. Within a block the slices are solved in order with solve_mip, see roll_block, and every slice
+        gets an equal share of time_limit. Only with the greedy apron engine the blocks run in parallel,
+        the 'mip' apron engine builds its models in the shared environment.
+        The slices keep the apron count of constraint (4) at NA_star, results['apron_count'] reports it. Optimality is not
+        proven: the status is SUBOPTIMAL without gap, counters and times are summed over the slices.
+        """
+        horizon = checkHorizon(horizon)
+        t_rolling_start = time.time()
+        components = getComponents(self.arrays)
+        fixed, components = fixIsolatedAircraft(self.arrays, components, {0: self.dom_gates, 1: self.int_gates})
+        blocks = [[self.all_aircraft[i] for i in component] for component in components]
+        num_slices = sum(len(sliceStarts([self.all_aircraft_times[ac][0] for ac in block], horizon['length'], horizon['overlap']))
+                         for block in blocks)
+        slice_limit = time_limit / max(num_slices, 1)
+
+        workers = min(horizon['workers'], len(blocks)) if self.config['apron_engine'] == 'greedy' else 1
+        if workers > 1 and threads is None:
+            threads = max((os.cpu_count() or workers) // workers, 1)
+
+        def rollBlock(block):
+            env = newEnv() if workers > 1 else None
+            try:
+                return self.roll_block(block, horizon, slice_limit, env=env, threads=threads, **mip_options)
+            finally:
+                if env is not None:
+                    env.dispose()
+
+        with ThreadPoolExecutor(max_workers=max(workers, 1)) as pool:
+            outcomes = list(pool.map(rollBlock, blocks))
+        total_time = time.time() - t_rolling_start
+
+        assignment = dict(fixed)
+        parts = [part for _, block_parts in outcomes for part in block_parts]
+        for frozen, _ in outcomes:
+            assignment.update(frozen)
+        objective = assignmentObjective(self.arrays, assignment)
+        apron_count = sum(1 for k in assignment.values() if k == 'apron')
+        if apron_count != self.NA_star:
+            print(f'Rolling horizon left {apron_count} aircraft at the apron, NA_star is {self.NA_star}')
+
+        # The slices overlap, so their root bounds do not add up to a bound of the instance
+        results = self.build_results(GRB.SUBOPTIMAL, objective, None, assignment, total_time, parts,
+                                     iter_log=[], formulation=mip_options.get('formulation', 'linearized'), model_reused=False,
+                                     time_to_first_incumbent=total_time, root_bound=None,
+                                     rolling_slices=len(parts), rolling_blocks=len(blocks), apron_count=apron_count)
+
+        # Only the complete assignment is an incumbent of the whole instance
+        trace = {'iters': np.array([results['iter_count'] or 0.0], dtype=float),
+                 'incumbent': np.array([objective], dtype=float),
+                 'bound': np.full(1, np.nan),
+                 'gap': np.full(1, np.nan),
+                 'runtime': np.array([total_time], dtype=float)}
+        results.update(self.trace_metrics(trace, objective, total_time))
+        return results
+
+    def roll_block(self, aircraft, horizon, slice_limit, **mip_options):
+        """
+        Assigns the aircraft of one block slice by slice and returns the assignment {ac: gate} and the results of the slices.
+        A slice holds the aircraft that are not assigned yet and arrive within horizon['length'] hours of its start,
+        together with the assigned aircraft still on the ground, which are fixed to their gates so the slice sees
+        the gate occupancy and the transfers to them. The aircraft arriving before the last horizon['overlap'] hours
+        of the slice are committed, the rest is solved again in the next slice.
+        The best fit placement of all remaining aircraft on the gates left free by the committed ones has the fewest
+        aircraft at the apron, so it is the MIP start of the slice and sets its apron count. A slice solution that
+        would force more aircraft to the apron later, or no solution within slice_limit, commits the placement instead.
+        """
+        times = self.all_aircraft_times
+        arrays = self.arrays
+        gates_per_type = {0: [k for k in self.dom_gates if k != 'apron'], 1: [k for k in self.int_gates if k != 'apron']}
+        step = horizon['length'] - horizon['overlap']
+
+        def placeRemaining(frozen):
+            placement = {}
+            for ac_type, gates in gates_per_type.items():
+                remaining = {ac: times[ac] for ac in aircraft if ac not in frozen and arrays.ac_type[arrays.ac_index[ac]] == ac_type}
+                placement.update(placeOnFreeGates(remaining, gates, releaseTimes(frozen, times, gates)))
+            return placement
+
+        def apronCount(assignment):
+            return sum(1 for k in assignment.values() if k == 'apron')
+
+        frozen, parts = {}, []
+        for t in sliceStarts([times[ac][0] for ac in aircraft], horizon['length'], horizon['overlap']):
+            placement = placeRemaining(frozen)
+            target = apronCount(frozen) + apronCount(placement)
+
+            free = [ac for ac in aircraft if ac not in frozen and times[ac][0] < t + horizon['length']]
+            first_arrival = min(times[ac][0] for ac in free)
+            context = {ac: k for ac, k in frozen.items() if times[ac][1] > first_arrival}
+            start = context | {ac: placement[ac] for ac in free}
+
+            sub = self.subproblem(free + list(context))
+            sub.NA_star = apronCount(start)
+            part = sub.solve_mip(slice_limit, start_assignment=start, fixed_assignment=context, **mip_options)
+            parts.append(part)
+
+            commit = [ac for ac in free if times[ac][0] < t + step]
+            if part['x_solution']:
+                candidate = frozen | {ac: part['x_solution'][ac][0] for ac in commit}
+                if apronCount(candidate) + apronCount(placeRemaining(candidate)) == target:
+                    frozen = candidate
+                    continue
+            frozen = frozen | {ac: placement[ac] for ac in commit}
+        return frozen, parts
+
+    def stitch_results(self, parts, offsets, fixed, total_time, formulation):
+        """
+        Merges the results of solve_mip on subproblems that partition the aircraft (apart from the fixed {ac: gate})
+        into one results dict of this instance. Part i started offsets[i] seconds into the solve.
+        Times, model counters and nodes are summed over the parts, total_time is the wall time of the whole solve.
+        The parts share no transfer passengers, so the objective of the stitched assignment is the sum of theirs.
+        All costs are nonnegative, so a part bound is 0 before it starts.
+        """
+        arrays = self.arrays
+        fixed_cost = float(sum((arrays.e + arrays.f)[arrays.ac_index[ac]] * arrays.ed[arrays.gate_index[k]] for ac, k in fixed.items()))
+
+        # Stitch the assignments together, the objective is only known if every part has a solution
+        assignment = dict(fixed)
+        complete = all(part['x_solution'] for part in parts)
+        for part in parts:
+            assignment.update({ac: k for ac, (k, _) in part['x_solution'].items()})
+        objective = assignmentObjective(arrays, assignment) if complete else None
+
+        final_bounds = [part['trace']['bound'][-1] if len(part['trace']['bound']) else 0.0 for part in parts]
+        bound = fixed_cost + sum(max(b, 0.0) for b in final_bounds)
+        gap = relativeGap(objective, bound) if objective is not None else None
+
+        status = next((part['status'] for part in parts if part['status'] != GRB.OPTIMAL), GRB.OPTIMAL)
+        reason = next((part['termination_reason'] for part in parts if part['status'] != GRB.OPTIMAL), 'optimal')
+
+        root_bounds = [part['root_bound'] for part in parts]
+        results = self.build_results(status, objective, gap, assignment if complete else {}, total_time, parts,
+                                     formulation=formulation, termination_reason=reason,
+                                     root_bound=fixed_cost + sum(root_bounds) if None not in root_bounds else None)
+        if parts and all(part['warm_start_objective'] is not None for part in parts):
+            results['warm_start_objective'] = fixed_cost + sum(part['warm_start_objective'] for part in parts)
+
+        # One trace over all parts: at every recorded time each part holds its last point, before its first point
+        # a part has no incumbent and bound 0. The sum of the part incumbents is an objective.
+        traces = [(part['trace'], offset) for part, offset in zip(parts, offsets)]
+        times  = sorted(set(float(offset + t) for trace, offset in traces for t in trace['runtime']))
+        columns = {name: [] for name in ('iters', 'incumbent', 'bound', 'gap', 'runtime')}
+        for t in times:
+            iters, incumbent, point_bound = 0.0, fixed_cost, fixed_cost
+            for trace, offset in traces:
+                point = np.searchsorted(trace['runtime'] + offset, t, side='right') - 1
+                if point < 0:
+                    incumbent = GRB.INFINITY
+                    continue
+                iters += trace['iters'][point]
+                incumbent += trace['incumbent'][point]
+                point_bound += max(trace['bound'][point], 0.0)
+            incumbent = min(incumbent, GRB.INFINITY)
+            for name, value in zip(columns, (iters, incumbent, point_bound, relativeGap(incumbent, point_bound), t)):
+                columns[name].append(value)
+        if objective is not None: # the stitched solution
+            for name, value in zip(columns, (sum(columns['iters'][-1:]), objective, bound, gap, total_time)):
+                columns[name].append(value)
+        trace = {name: np.array(values, dtype=float) for name, values in columns.items()}
+
+        first = np.flatnonzero(trace['incumbent'] < GRB.INFINITY)
+        results['time_to_first_incumbent'] = float(trace['runtime'][first[0]]) if len(first) else None
+        results.update(self.trace_metrics(trace, objective, total_time))
+        return results
+
+    def solve_local_search(self, time_limit):
+        """
+        Simulated annealing from the greedy assignment, for instances too large to build the MIP.
+        It stops at time_limit or earlier when it stops improving (termination_reason 'stagnation').
+        Returns the same results dict as solve_mip, with status SUBOPTIMAL as optimality is not proven and no gap.
+        The greedy construction counts as build time, iter_log holds (iteration, best objective, None, None, runtime)
+        and the trace has no bound.
+        """
+        t_build_start = time.time()
+        start = greedyAssignment(self.arrays, self.dom_gates, self.int_gates, self.dom_gate_paths, self.int_gate_paths)
+        start_objective = assignmentObjective(self.arrays, start)
+        t_build = time.time() - t_build_start
+
+        t_solve_start = time.time()
+        assignment, objective, log = simulatedAnnealing(self.arrays, start, {0: self.dom_gates, 1: self.int_gates},
+                                                        time_limit=time_limit, seed=self.config['seed'])
+        t_solve = time.time() - t_solve_start
+
+        results = self.build_results(GRB.SUBOPTIMAL, objective, None, assignment, t_build + t_solve,
+                                     build_time=t_build, solve_time=t_solve,
+                                     iter_log=[(iteration, best, None, None, runtime) for iteration, best, runtime in log],
+                                     warm_start_objective=start_objective, warm_start_time=t_build,
+                                     time_to_first_incumbent=0.0, optimize_time=t_solve,
+                                     termination_reason='time_limit' if t_solve >= time_limit else 'stagnation')
+
+        trace = {'iters': np.array([point[0] for point in log], dtype=float),
+                 'incumbent': np.array([point[1] for point in log], dtype=float),
+                 'bound': np.full(len(log), np.nan),
+                 'gap': np.full(len(log), np.nan),
+                 'runtime': np.array([point[2] for point in log], dtype=float)}
+        results.update(self.trace_metrics(trace, objective, t_solve))
         return results
 
+    def build_results(self, status, objective, gap, assignment, total_time, parts=(), **values):
+        """
+        The results dict of solve for the complete assignment {ac: gate} (empty without a solution), the layout
+        every engine returns. Times, model sizes and counters are summed over parts, the solve_mip results the
+        solve was made of, and are None (0.0 for the times of the results dict itself) without any.
+        The root bound is only summed if every part has one. values sets or overrides keys.
+        """
+        def total(key):
+            values = [part[key] for part in parts if part.get(key) is not None]
+            return sum(values) if values else None
+
+        results = {
+            'status': status,
+            'objective': objective,
+            'gap': gap,
+            'build_time': total('build_time') or 0.0,
+            'solve_time': total('solve_time') or 0.0,
+            'total_time': total_time,
+            'x_solution': {ac: [k, 1.0] for ac, k in assignment.items()},
+            'iter_log': [point for part in parts for point in part['iter_log']],
+            'model': None,
+            'NA_star': self.NA_star,
+            'total_pax': self.total_passengers,
+            'objective/pax': objective/self.total_passengers if objective is not None and self.total_passengers > 0 else 0,
+            'pruned_y_vars': total('pruned_y_vars') or 0,
+            'no_overlap': parts[0]['no_overlap'] if parts else None,
+            'formulation': parts[0]['formulation'] if parts else None,
+            'model_reused': bool(parts) and all(part['model_reused'] for part in parts),
+            'warm_start_objective': None,
+            'warm_start_time': total('warm_start_time') or 0.0,
+            'time_to_first_incumbent': None,
+            'termination_reason': terminationReason(status),
+        }
+        results.update({key: total(key) for key in self.PHASE_TIMES + self.COUNTERS})
+        results.update(self.generation_times)
+        root_bounds = [part['root_bound'] for part in parts]
+        results['root_bound'] = sum(root_bounds) if parts and None not in root_bounds else None
+        results.update(values)
+        return results
+
+    def trace_metrics(self, trace, objective, end_time):
+        """The trace with the metrics derived from it, the primal integral is taken against the final objective."""
+        return {
+            'trace': trace,
+            'time_to_1pct_gap': timeToGap(trace, 0.01),
+            'primal_integral': primalIntegral(trace, objective, end_time),
+        }
+
     def extract_results(self, model, x, t_build, t_solve, iter_log):
         """Safely extract results from solved model."""
         x_solution = {}
         objective = None
         gap = None
         
-        if model.status in [GRB.OPTIMAL, GRB.TIME_LIMIT]:
+        # Without a solution ObjVal is infinite and there is no x to read
+        if model.status in [GRB.OPTIMAL, GRB.TIME_LIMIT, GRB.INTERRUPTED] and model.SolCount > 0:
             try:
                 objective = model.ObjVal
             except:
@@ -190,20 +879,8 @@ class GateAssignmentProblem:
             except:
                 pass
         
-        return {
-            'status': model.status,
-            'objective': objective,
-            'gap': gap,
-            'build_time': t_build,
-            'solve_time': t_solve,
-            'total_time': t_build + t_solve,
-            'x_solution': x_solution,
-            'iter_log': iter_log,
-            'model': model,
-            'NA_star':self.NA_star,
-            'total_pax':self.total_passengers,
-            'objective/pax': objective/self.total_passengers if objective is not None and self.total_passengers > 0 else 0
-        }
+        return self.build_results(model.status, objective, gap, {}, t_build + t_solve, build_time=t_build, solve_time=t_solve,
+                                  x_solution=x_solution, iter_log=iter_log, model=model)
 
     def plot_timetable(self, results, fig_save_path=None)-> None:
 
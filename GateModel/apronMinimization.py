@@ -1,5 +1,8 @@
 from gurobipy import quicksum, GRB, Model
 from typing import Dict, List
+from bisect import bisect_left, bisect_right
+
+from GateModel.gurobiEnv import getEnv
 
 def constructArcs(aircraft:dict) -> tuple[List, Dict, int, int]:
     
@@ -21,22 +24,20 @@ def constructArcs(aircraft:dict) -> tuple[List, Dict, int, int]:
     
     # arcs.append((source, sink))
 
-    # Arc between aircraft if they don't overlap
+    # Arc between aircraft if they don't overlap, i.e. j arrives after i departs.
+    # With the aircraft sorted by arrival the successors of i are a suffix of the sorted list.
+    by_arrival = sorted(aircraft_list, key=lambda ac: aircraft[ac][0])
+    arrivals   = [aircraft[ac][0] for ac in by_arrival]
     for i in aircraft_list:
-        for j in aircraft_list:
-            if i == j:
-                continue
-
-            arri, depi = aircraft[i]
-            arrj, depj = aircraft[j]
-
-            if depi <= arrj:
+        arri, depi = aircraft[i]
+        for j in by_arrival[bisect_left(arrivals, depi):]:
+            if i != j:
                 arcs.append((nodes[i], nodes[j]))
 
     return arcs, nodes, source, sink
 
 def optimizeApronAssignmentModel(arcs:list, gates:list, nodes:dict, source:int, sink:int, verbose:bool=False, write_to_file:bool=False) -> tuple[Model, Dict]:
-    apron_model = Model('Apron')
+    apron_model = Model('Apron', env=getEnv())
     
     if write_to_file:
         apron_model.params.LogFile = f'log_files/apron.log'
@@ -50,26 +51,31 @@ def optimizeApronAssignmentModel(arcs:list, gates:list, nodes:dict, source:int,
     apron_model.addConstr(quicksum(z[i,j] for (i,j) in arcs if i == source) <= len(gates) - 1, name=f'flowUnitsSource')
     apron_model.addConstr(quicksum(z[i,j] for (i,j) in arcs if j == sink)   <= len(gates) - 1, name=f'flowUnitsSink')
 
+    # Outgoing and incoming arcs per node, so flow conservation does not rescan all arcs for every node
+    arcs_out = {k: [] for k in nodes.values()}
+    arcs_in  = {k: [] for k in nodes.values()}
+    for (i,j) in arcs:
+        if i in arcs_out:
+            arcs_out[i].append((i,j))
+        if j in arcs_in:
+            arcs_in[j].append((i,j))
+
     for k in nodes.values():
-        lhs = quicksum(z[k,j] for (i,j) in arcs if i==k)
-        rhs = quicksum(z[i,k] for (i,j) in arcs if j==k) 
+        lhs = quicksum(z[arc] for arc in arcs_out[k])
+        rhs = quicksum(z[arc] for arc in arcs_in[k])
 
         apron_model.addConstr(lhs == rhs, name=f'flowConservationNode_{k}')
-        apron_model.addConstr(quicksum(z[k,j] for (i,j) in arcs if i==k) <= 1, name=f'oneOutgoingNode_{k}')
+        apron_model.addConstr(quicksum(z[arc] for arc in arcs_out[k]) <= 1, name=f'oneOutgoingNode_{k}')
 
-    if not verbose:
-        apron_model.Params.OutputFlag = 0
+    if verbose:
+        apron_model.Params.OutputFlag = 1
     apron_model.optimize()
 
     if apron_model.status == GRB.OPTIMAL or apron_model.status == GRB.TIME_LIMIT:
         return apron_model, z
     else:
-        print(f'\n\nModel not optimal\n\n')
-        choice = input(f'Do you still want to continue despite non-optimality? y/n')
-        if choice == 'y':
-            return apron_model, z
-        else:
-            raise RuntimeError('Model not optimal, exiting')
+        # No interactive prompt here, a batch run would hang on it
+        raise RuntimeError(f'Apron model not optimal, status {apron_model.status}')
 
 def findAircraftDistribution(z:dict,aircraft:dict, arcs:list, source:int, model:Model) -> int:
     num_paths = sum(z[source, j].X for (i, j) in arcs if i == source)
@@ -79,19 +85,111 @@ def findAircraftDistribution(z:dict,aircraft:dict, arcs:list, source:int, model:
 
     return NA_x
 
-def findMinApron(dom_aircraft:dict, int_aircraft:dict, dom_gates:list, int_gates:list) -> int:
+def findGateSchedules(z:dict, arcs:list, source:int, sink:int, node_to_aircraft:dict) -> List:
+    # Extract gate schedules
+    path_starts = [j for (i, j) in arcs if i == source and z[i, j].X > 0.5]
+
+    gate_paths = []
+    for start in path_starts:
+        path = []
+        current = start
+
+        while current != sink:
+            if current != source:
+                path.append(node_to_aircraft[current])
+
+            next_nodes = [j for (i, j) in arcs if i == current and z[i, j].X > 0.5]
+            if not next_nodes:
+                break
+
+            current = next_nodes[0]
+        
+        gate_paths.append(path)
+
+    return gate_paths
+
+def findGateSequences(aircraft:dict, num_gates:int, release:List[float]=None) -> List[List[str]]:
+    '''
+    Returns the per-gate sequences of a largest set of aircraft that fits on num_gates gates.
+    This is interval scheduling on identical machines: aircraft are taken in order of departure and placed
+    on the gate that became free the latest while still free at the arrival (best fit), an unused gate
+    if no used gate is free, or the apron if all gates are busy. This greedy is exact and runs in O(n log n + n*num_gates).
+    With release, gate g only becomes free at release[g], e.g. when it is still held by an aircraft assigned earlier,
+    and a sequence is returned for every gate. The best fit stays exact as a gate is only described by when it is free.
+    '''
+    order = sorted(aircraft, key=lambda ac: (aircraft[ac][1], aircraft[ac][0]))
+
+    sequences  = []
+    free_times = [] # sorted (time gate becomes free, gate) of the used gates
+    if release is not None:
+        sequences  = [[] for _ in range(num_gates)]
+        free_times = sorted((release[gate], gate) for gate in range(num_gates))
+    for ac in order:
+        arr, dep = aircraft[ac]
+        pos = bisect_right(free_times, (arr, num_gates))
+        if pos > 0:
+            gate = free_times.pop(pos - 1)[1]
+        elif len(sequences) < num_gates:
+            gate = len(sequences)
+            sequences.append([])
+        else:
+            continue # apron
 
-    dom_arcs, dom_nodes, dom_source, dom_sink = constructArcs(dom_aircraft)
-    int_arcs, int_nodes, int_source, int_sink = constructArcs(int_aircraft)
+        sequences[gate].append(ac)
+        free_times.insert(bisect_right(free_times, (dep, gate)), (dep, gate))
 
-    dom_apron_model, dom_z = optimizeApronAssignmentModel(dom_arcs, dom_gates, dom_nodes, dom_source, dom_sink)
-    int_apron_model, int_z = optimizeApronAssignmentModel(int_arcs, int_gates, int_nodes, int_source, int_sink)
-    
-    NA_D = findAircraftDistribution(dom_z, dom_aircraft, dom_arcs, dom_source, dom_apron_model)
-    NA_I = findAircraftDistribution(int_z, int_aircraft, int_arcs, int_source, int_apron_model)
+    return sequences
+
+def findMaxAtGatesMIP(aircraft:dict, gates:list) -> tuple[float, List[List[str]]]:
+    '''Returns the number of aircraft at the gates and the gate sequences from the maximum cost network flow model'''
+    arcs, nodes, source, sink = constructArcs(aircraft)
+    apron_model, z = optimizeApronAssignmentModel(arcs, gates, nodes, source, sink)
+
+    NA_x = findAircraftDistribution(z, aircraft, arcs, source, apron_model)
+    node_to_aircraft = {n: ac for ac, n in nodes.items()}
+    schedules = findGateSchedules(z, arcs, source, sink, node_to_aircraft)
+    apron_model.dispose()
+
+    return NA_x, schedules
+
+def findMaxAtGates(aircraft:dict, gates:list, engine:str='greedy') -> tuple[float, List[List[str]]]:
+    '''
+    Returns the maximum number of aircraft that can be at the gates and the sequences per gate.
+    engine 'greedy' uses findGateSequences, 'mip' the network flow model, 'check' runs both and compares them.
+    '''
+    num_gates = len(gates) - 1 # gates includes the apron
+
+    if engine == 'greedy':
+        sequences = findGateSequences(aircraft, num_gates)
+        return sum(len(seq) for seq in sequences), sequences
+
+    if engine == 'mip':
+        return findMaxAtGatesMIP(aircraft, gates)
+
+    if engine == 'check':
+        sequences = findGateSequences(aircraft, num_gates)
+        NA_x      = sum(len(seq) for seq in sequences)
+        NA_x_mip, _ = findMaxAtGatesMIP(aircraft, gates)
+        if round(NA_x_mip) != NA_x:
+            raise RuntimeError(f'Greedy apron engine found {NA_x} aircraft at gates, the MIP found {NA_x_mip}')
+        return NA_x, sequences
+
+    raise ValueError(f'Unknown apron engine {engine}, choose from greedy, mip, check')
+
+def findMinApron(dom_aircraft:dict, int_aircraft:dict, dom_gates:list, int_gates:list, engine:str='greedy',
+                 return_schedules:bool=False):
+    '''
+    Returns NA_star, the minimum number of aircraft at the apron.
+    If return_schedules, returns (NA_star, dom_gate_paths, int_gate_paths) with the aircraft sequence of every used gate.
+    '''
+
+    NA_D, dom_gate_paths = findMaxAtGates(dom_aircraft, dom_gates, engine)
+    NA_I, int_gate_paths = findMaxAtGates(int_aircraft, int_gates, engine)
 
     NA_star = len(dom_aircraft)+len(int_aircraft) - NA_I - NA_D
 
+    if return_schedules:
+        return NA_star, dom_gate_paths, int_gate_paths
     return NA_star
 
 
@@ -109,29 +207,6 @@ def main():
 
         return aircraft_at_gates, aircraft_at_apron
 
-    def findGateSchedules(z:dict, arcs:list, source:int, sink:int, node_to_aircraft:dict) -> List:
-        # Extract gate schedules
-        path_starts = [j for (i, j) in arcs if i == source and z[i, j].X == 1.0]
-
-        gate_paths = []
-        for start in path_starts:
-            path = []
-            current = start
-
-            while current != sink:
-                if current != source:
-                    path.append(node_to_aircraft[current])
-
-                next_nodes = [j for (i, j) in arcs if i == current and z[i, j].X == 1.0]
-                if not next_nodes:
-                    break
-
-                current = next_nodes[0]
-            
-            gate_paths.append(path)
-
-        return gate_paths
-
     dom_gates = [1,2,3,'apron']
     dom_aircraft = {'dom1': (0,1),
                     'dom2': (0,1),
@@ -189,6 +264,14 @@ def main():
     for g, path in enumerate(int_gate_paths, start=1):
         print(f"Int_Gate {g}: {path}")
 
+    print('\nGreedy engine:')
+    NA_star, dom_gate_paths, int_gate_paths = findMinApron(dom_aircraft, int_aircraft, dom_gates, int_gates, return_schedules=True)
+    for g, path in enumerate(dom_gate_paths, start=1):
+        print(f"Dom_Gate {g}: {path}")
+    for g, path in enumerate(int_gate_paths, start=1):
+        print(f"Int_Gate {g}: {path}")
+    print('Num aircraft at apron:', NA_star)
+
     print("\nNum dom aircraft at gates:", NA_D)
     # print("Num dom aircraft at apron:", NAD)
     print("Num int aircraft at gates:", NA_I)
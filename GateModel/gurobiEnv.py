@@ -0,0 +1,36 @@
+import os
+import atexit
+import gurobipy as gp
+
+_env     = None
+_env_pid = None
+
+def getEnv() -> gp.Env:
+    '''
+    Returns the Gurobi environment of this process, created on first use with the output switched off once for all models.
+    Models that should log set OutputFlag on the model itself.
+    Worker processes get their own environment, an Env inherited from the parent process can not be used.
+    '''
+    global _env, _env_pid
+    if _env is None or _env_pid != os.getpid():
+        _env, _env_pid = newEnv(), os.getpid()
+    return _env
+
+def newEnv() -> gp.Env:
+    '''
+    Returns a new started environment with the output switched off, for models that are optimized concurrently
+    in threads of one process, which can not share an environment. The caller disposes it.
+    '''
+    env = gp.Env(empty=True)
+    env.setParam('OutputFlag', 0)
+    env.start()
+    return env
+
+def disposeEnv() -> None:
+    '''Releases the environment of this process, getEnv creates a new one when it is needed again'''
+    global _env, _env_pid
+    if _env is not None and _env_pid == os.getpid():
+        _env.dispose()
+    _env, _env_pid = None, None
+
+atexit.register(disposeEnv)
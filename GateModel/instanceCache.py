@@ -0,0 +1,92 @@
+import os
+import json
+import pickle
+import hashlib
+import numpy as np
+from pathlib import Path
+
+GATE_MODEL_DIR = Path(__file__).resolve().parent
+
+def plainValue(value):
+    '''Converts numpy scalars to python values so they hash the same as the python value'''
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, dict):
+        return {k: plainValue(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [plainValue(v) for v in value]
+    return value
+
+def stableHash(obj) -> str:
+    '''Returns a hash of a json-like object that does not depend on dict order or numpy types'''
+    return hashlib.sha1(json.dumps(plainValue(obj), sort_keys=True, default=str).encode()).hexdigest()
+
+def codeVersion() -> str:
+    '''Returns a hash of the GateModel sources, so cached entries are invalidated when the model code changes'''
+    digest = hashlib.sha1()
+    for path in sorted(GATE_MODEL_DIR.glob('*.py')):
+        digest.update(path.name.encode())
+        digest.update(path.read_bytes())
+    return digest.hexdigest()
+
+class InstanceCache:
+    """
+    On-disk cache of generated instances and solve results.
+    Entries are pickles keyed on a hash of the full config (which includes the seed), the kind of entry
+    and the version of the GateModel code. When the cache grows beyond max_bytes the least recently used
+    entries are removed.
+    """
+
+    def __init__(self, cache_dir='.gate_cache', max_bytes=512 * 2**20):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self.code_version = codeVersion()
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    def key(self, kind, config, **options) -> str:
+        return stableHash({'kind': kind, 'config': config, 'options': options, 'code_version': self.code_version})
+
+    def path(self, key) -> Path:
+        return self.cache_dir / f'{key}.pkl'
+
+    def get(self, key):
+        """Returns the cached value, or None if there is no entry."""
+        path = self.path(key)
+        try:
+            with open(path, 'rb') as f:
+                value = pickle.load(f)
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+            return None
+
+        os.utime(path) # mark as recently used
+        return value
+
+    def put(self, key, value) -> None:
+        path = self.path(key)
+        tmp_path = path.with_suffix(f'.{os.getpid()}.tmp')
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path) # atomic, parallel workers never see half written entries
+
+        self.evict()
+
+    def evict(self) -> None:
+        """Remove least recently used entries until the cache fits in max_bytes."""
+        entries = []
+        for path in self.cache_dir.glob('*.pkl'):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+
+    def clear(self) -> None:
+        for path in self.cache_dir.glob('*.pkl'):
+            path.unlink(missing_ok=True)
@@ -0,0 +1,45 @@
+import numpy as np
+from gurobipy import GRB
+
+class LazyLinearization:
+    """
+    Constraints (6), y_ijkl >= x_ik + x_jl - 1, left out of the model and separated in the MIP callback.
+    At an integer solution only one gate pair per aircraft pair is active, so only few of the rows are ever needed.
+    A row is added with cbLazy when an incumbent candidate (MIPSOL) or the LP relaxation at a node (MIPNODE) violates it.
+    The rows are given as indices into variables, the variables of the model in any order.
+    """
+
+    def __init__(self, variables:list, y_idx, xk_idx, xl_idx, tol=1e-6):
+        self.variables = variables
+        self.y_idx  = np.asarray(y_idx, dtype=np.int64)
+        self.xk_idx = np.asarray(xk_idx, dtype=np.int64)
+        self.xl_idx = np.asarray(xl_idx, dtype=np.int64)
+        self.tol = tol
+        self.reset()
+
+    def reset(self) -> None:
+        '''Clears the counts, Gurobi drops the lazy rows of a previous optimize as well'''
+        self.added = np.zeros(len(self.y_idx), dtype=bool)
+        self.cuts  = 0
+
+    @property
+    def rows_added(self) -> int:
+        '''Number of distinct rows (6) added during the solve'''
+        return int(self.added.sum())
+
+    def separate(self, m, where) -> int:
+        '''Adds the violated rows of the current solution as lazy constraints and returns how many'''
+        if where == GRB.Callback.MIPSOL:
+            values = np.array(m.cbGetSolution(self.variables))
+        elif where == GRB.Callback.MIPNODE and m.cbGet(GRB.Callback.MIPNODE_STATUS) == GRB.OPTIMAL:
+            values = np.array(m.cbGetNodeRel(self.variables))
+        else:
+            return 0
+
+        violated = np.flatnonzero(values[self.y_idx] < values[self.xk_idx] + values[self.xl_idx] - 1 - self.tol)
+        for r in violated.tolist():
+            y, xk, xl = (self.variables[idx[r]] for idx in (self.y_idx, self.xk_idx, self.xl_idx))
+            m.cbLazy(y >= xk + xl - 1)
+        self.added[violated] = True
+        self.cuts += len(violated)
+        return len(violated)
@@ -0,0 +1,141 @@
+import math
+import time
+import numpy as np
+from typing import Dict
+
+from GateModel.ConstructParameters import InstanceArrays
+from GateModel.warmStart import assignmentObjective
+
+class AssignmentState:
+    """
+    Gate assignment held as an array of gate indices, with delta-cost evaluation of moves.
+    The transfer term of the model counts pair i<j with p[i,j], so W = triu(p) + triu(p).T gives the
+    cost of every pair symmetrically and the cost change of moving aircraft i from gate a to b is
+    w_i (ed_b - ed_a) + sum_j W_ij (d_b,g(j) - d_a,g(j)).
+    """
+
+    def __init__(self, arrays:InstanceArrays, assignment:Dict[str, str]):
+        self.arrays = arrays
+        upper       = np.triu(arrays.p, 1).astype(float)
+        self.W      = upper + upper.T
+        self.w      = (arrays.e + arrays.f).astype(float)
+        self.d      = arrays.d
+        self.ed     = arrays.ed
+        self.apron  = arrays.gate_index['apron']
+
+        # Aircraft of the same type that are on the ground together can not share a gate
+        a, dep = arrays.arrivals, arrays.departures
+        same_type     = arrays.ac_type[:, None] == arrays.ac_type[None, :]
+        self.conflict = (a[:, None] < dep[None, :]) & (a[None, :] < dep[:, None]) & same_type
+        np.fill_diagonal(self.conflict, False)
+
+        self.gate = np.array([arrays.gate_index[assignment[ac]] for ac in arrays.aircraft], dtype=np.int64)
+
+    def objective(self) -> float:
+        return assignmentObjective(self.arrays, self.assignment())
+
+    def assignment(self) -> Dict[str, str]:
+        return {ac: self.arrays.gates[k] for ac, k in zip(self.arrays.aircraft, self.gate)}
+
+    def move_delta(self, i:int, b:int) -> float:
+        a = self.gate[i]
+        return self.w[i] * (self.ed[b] - self.ed[a]) + self.W[i] @ (self.d[b, self.gate] - self.d[a, self.gate])
+
+    def fits(self, i:int, b:int, ignore:int=-1) -> bool:
+        '''True if aircraft i can be at gate b without overlapping anyone there, aircraft ignore excluded'''
+        if b == self.apron:
+            return True
+        others = self.gate == b
+        if ignore >= 0:
+            others[ignore] = False
+        return not np.any(self.conflict[i] & others)
+
+    def swap_delta(self, i:int, j:int) -> float:
+        '''Cost change of exchanging the gates of i and j'''
+        a, b = self.gate[i], self.gate[j]
+        delta = self.move_delta(i, b)
+        self.gate[i] = b
+        delta += self.move_delta(j, a)
+        self.gate[i] = a
+        return delta
+
+def simulatedAnnealing(arrays:InstanceArrays, start:Dict[str, str], gates_per_type:Dict[int, list],
+                       time_limit:float=60, seed:int=0, initial_acceptance:float=0.3,
+                       max_stall:int=None) -> tuple[Dict[str, str], float, list]:
+    '''
+    Improves a feasible assignment with simulated annealing within time_limit seconds, or until max_stall proposals
+    in a row did not improve the best assignment (by default max(10000, 1000 * number of aircraft)).
+    Two moves keep every assignment feasible: relocating an aircraft between non-apron gates of its type,
+    and swapping the gates of two aircraft of the same type (which may involve the apron). Neither changes
+    the number of aircraft at the apron, so constraint (4) keeps holding.
+    The start temperature accepts an average worsening move with probability initial_acceptance,
+    and the temperature decreases geometrically to 1e-3 of that over the time budget.
+    Returns the best assignment, its objective and a log of (iteration, best objective, runtime) at every improvement.
+    '''
+    rng   = np.random.default_rng(seed)
+    state = AssignmentState(arrays, start)
+    n     = len(arrays.aircraft)
+
+    gate_idx = {t: np.array([arrays.gate_index[k] for k in gates if k != 'apron'], dtype=np.int64)
+                for t, gates in gates_per_type.items()}
+    by_type  = {t: np.flatnonzero(arrays.ac_type == t) for t in gates_per_type}
+
+    current = state.objective()
+    best, best_gate = current, state.gate.copy()
+    log = [(0, float(best), 0.0)]
+    if n < 2:
+        return state.assignment(), best, log
+
+    def propose():
+        '''Returns (delta, apply) of a random feasible move, or None'''
+        i = int(rng.integers(n))
+        t = int(arrays.ac_type[i])
+        if rng.random() < 0.5 and state.gate[i] != state.apron and len(gate_idx[t]) > 1:
+            b = int(rng.choice(gate_idx[t]))
+            if b == state.gate[i] or not state.fits(i, b):
+                return None
+            def apply():
+                state.gate[i] = b
+            return state.move_delta(i, b), apply
+
+        j = int(rng.choice(by_type[t]))
+        a, b = state.gate[i], state.gate[j]
+        if a == b or not state.fits(i, b, ignore=j) or not state.fits(j, a, ignore=i):
+            return None
+        def apply():
+            state.gate[i], state.gate[j] = b, a
+        return state.swap_delta(i, j), apply
+
+    # Start temperature from a sample of worsening moves
+    worse = [move[0] for move in (propose() for _ in range(200)) if move is not None and move[0] > 0]
+    t_start = (np.mean(worse) / -math.log(initial_acceptance)) if worse else 1.0
+    t_end   = t_start * 1e-3
+
+    if max_stall is None:
+        max_stall = max(10000, 1000 * n)
+
+    start_time = time.time()
+    iteration  = 0
+    last_improvement = 0
+    while True:
+        elapsed = time.time() - start_time
+        if elapsed >= time_limit or iteration - last_improvement >= max_stall:
+            break
+        temperature = t_start * (t_end / t_start) ** (elapsed / time_limit)
+
+        for _ in range(100): # check the clock every 100 proposals
+            iteration += 1
+            move = propose()
+            if move is None:
+                continue
+            delta, apply = move
+            if delta <= 0 or rng.random() < math.exp(-delta / temperature):
+                apply()
+                current += delta
+                if current < best - 1e-9:
+                    best, best_gate = current, state.gate.copy()
+                    last_improvement = iteration
+                    log.append((iteration, float(best), time.time() - start_time))
+
+    state.gate = best_gate
+    return state.assignment(), state.objective(), log
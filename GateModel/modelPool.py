@@ -0,0 +1,116 @@
+import numpy as np
+from collections import OrderedDict
+from gurobipy import GRB, QuadExpr, LinExpr
+
+from GateModel.BuildModel import getTransferPairs, Y_FORMULATIONS
+from GateModel.instanceCache import stableHash
+
+class ReusableGateModel:
+    """
+    A built gate model that can be re-optimized for another instance with the same structure.
+    The structure is everything that determines the variables and constraints: the aircraft, their times and gates.
+    The passenger numbers p_ij, e_i, f_i only appear in the objective and NA_star only in the right-hand side
+    of constraint (4), so update changes those in place instead of building a new model.
+    """
+
+    def __init__(self, problem, build, build_options:dict):
+        self.model, self.x, self.y = build(
+            problem.num_aircraft, problem.all_aircraft, problem.g, problem.gates_available_per_ac,
+            problem.p_ij, problem.e_i, problem.f_i, problem.d_kl, problem.ed_k,
+            problem.dom_gates, problem.dom_aircraft, problem.int_gates, problem.int_aircraft,
+            problem.distinct_times, problem.comp_ir, problem.NA_star, **build_options
+        )
+        self.model.update()
+
+        # Index arrays into the instance arrays for every objective coefficient
+        arrays = problem.arrays
+        pairs  = getTransferPairs(problem.num_aircraft, problem.all_aircraft, problem.p_ij, build_options.get('sparse', False))
+        terms  = [(i, j, k, l) for (i, j) in pairs
+                  for k in problem.gates_available_per_ac[problem.all_aircraft[i]]
+                  for l in problem.gates_available_per_ac[problem.all_aircraft[j]]]
+        self.term_i = np.array([i for i, j, k, l in terms], dtype=np.int64)
+        self.term_j = np.array([j for i, j, k, l in terms], dtype=np.int64)
+        self.term_k = np.array([arrays.gate_index[k] for i, j, k, l in terms], dtype=np.int64)
+        self.term_l = np.array([arrays.gate_index[l] for i, j, k, l in terms], dtype=np.int64)
+
+        self.x_vars = list(self.x.values())
+        self.x_ac   = np.array([arrays.ac_index[ac] for ac, k in self.x], dtype=np.int64)
+        self.x_gate = np.array([arrays.gate_index[k] for ac, k in self.x], dtype=np.int64)
+        if self.model._formulation in Y_FORMULATIONS:
+            self.y_vars = [self.y[term] for term in terms]
+        else:
+            self.term_x_i = [self.x[problem.all_aircraft[i], k] for i, j, k, l in terms]
+            self.term_x_j = [self.x[problem.all_aircraft[j], l] for i, j, k, l in terms]
+
+    def update(self, problem) -> None:
+        '''
+        Sets the objective coefficients and NA_star of problem, which must have the same structure.
+        The previous solution is kept as MIP start, Gurobi discards it if it no longer fits the new NA_star.
+        '''
+        m = self.model
+        if m.SolCount > 0:
+            m.setAttr('Start', m.getVars(), m.getAttr('X', m.getVars()))
+
+        arrays = problem.arrays
+        transfer = (arrays.p[self.term_i, self.term_j] * arrays.d[self.term_k, self.term_l]).tolist()
+        local    = ((arrays.e + arrays.f)[self.x_ac] * arrays.ed[self.x_gate]).tolist()
+
+        if m._formulation in Y_FORMULATIONS:
+            m.setAttr('Obj', self.y_vars, transfer)
+            m.setAttr('Obj', self.x_vars, local)
+        else:
+            objective = QuadExpr()
+            objective.addTerms(transfer, self.term_x_i, self.term_x_j)
+            objective.add(LinExpr(local, self.x_vars))
+            m.setObjective(objective, GRB.MINIMIZE)
+
+        m._apron_constr.RHS = problem.NA_star
+        m.update()
+
+class ModelPool:
+    """
+    Keeps the most recently used max_models built models, keyed on the structure of the instance and the build options.
+    Sweeps that only change passenger numbers build one model per structural instance and update it for the other runs.
+    Models live in the process that built them, so a pool can not be shared between worker processes.
+    """
+
+    def __init__(self, max_models=4):
+        self.max_models = max_models
+        self.models = OrderedDict()
+
+    @staticmethod
+    def structureKey(problem, builder:str, build_options:dict) -> str:
+        options = {name: value for name, value in build_options.items() if name != 'all_aircraft_times'}
+        structure = {
+            'builder': builder,
+            'options': options,
+            'aircraft': problem.all_aircraft,
+            'gates': problem.gates_available_per_ac,
+            'times': problem.all_aircraft_times,
+            'distinct_times': problem.distinct_times,
+        }
+        if build_options.get('sparse', False):
+            # The sparse model only has y-variables for the pairs with transfers
+            structure['pairs'] = getTransferPairs(problem.num_aircraft, problem.all_aircraft, problem.p_ij, True)
+        return stableHash(structure)
+
+    def get(self, problem, builder:str, build, build_options:dict) -> tuple[ReusableGateModel, bool]:
+        '''Returns the model for problem, updated to its coefficients, and whether an existing model was reused'''
+        key = self.structureKey(problem, builder, build_options)
+        if key in self.models:
+            self.models.move_to_end(key)
+            handle = self.models[key]
+            handle.update(problem)
+            return handle, True
+
+        handle = ReusableGateModel(problem, build, build_options)
+        self.models[key] = handle
+        while len(self.models) > self.max_models:
+            _, old = self.models.popitem(last=False)
+            old.model.dispose()
+        return handle, False
+
+    def clear(self) -> None:
+        for handle in self.models.values():
+            handle.model.dispose()
+        self.models.clear()
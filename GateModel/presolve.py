@@ -0,0 +1,53 @@
+import numpy as np
+import scipy.sparse as sp
+from scipy.sparse.csgraph import connected_components
+from typing import Dict, List
+
+from GateModel.ConstructParameters import InstanceArrays
+
+PRESOLVE_STATS = ['presolve_time', 'presolve_components', 'presolve_fixed', 'presolve_x_vars_removed', 'presolve_y_vars_removed']
+
+def getComponents(arrays:InstanceArrays) -> List[List[int]]:
+    '''
+    Returns the connected components of the aircraft, as lists of aircraft indices, where aircraft are connected
+    if they are on the ground together or have transfer passengers between them.
+    Aircraft of different components never compete for a gate and add no transfer cost together,
+    and as components are apart in time, the minimum apron count NA_star of the instance is the sum of theirs.
+    So with constraint (4) every component has to use exactly its own NA_star and can be solved on its own.
+    '''
+    n = len(arrays.aircraft)
+    if n == 0:
+        return []
+    overlap = (arrays.arrivals[:, None] < arrays.departures[None, :]) & (arrays.arrivals[None, :] < arrays.departures[:, None])
+    linked  = overlap | (arrays.p > 0) | (arrays.p.T > 0)
+    n_components, labels = connected_components(sp.csr_matrix(linked), directed=False)
+    return [np.flatnonzero(labels == c).tolist() for c in range(n_components)]
+
+def fixIsolatedAircraft(arrays:InstanceArrays, components:List[List[int]], gates_per_type:dict) -> tuple[Dict[str, str], List[List[int]]]:
+    '''
+    Aircraft alone in their component only pay for their local passengers, so they go to the gate of their type
+    closest to the entrance, or to the apron if their type has no gates.
+    Returns the fixed assignment {ac: gate} and the components that are left to solve.
+    '''
+    fixed, remaining = {}, []
+    for component in components:
+        if len(component) > 1:
+            remaining.append(component)
+            continue
+        i = component[0]
+        gates = [k for k in gates_per_type[arrays.ac_type[i]] if k != 'apron']
+        fixed[arrays.aircraft[i]] = min(gates, key=lambda k: arrays.ed[arrays.gate_index[k]]) if gates else 'apron'
+    return fixed, remaining
+
+def countModelVars(arrays:InstanceArrays, gates_per_type:dict, groups:List[List[int]], sparse:bool=False) -> tuple[int, int]:
+    '''Number of x- and y-variables of the models of the aircraft groups, y-variables for the pairs within each group'''
+    n_gates = np.array([len(gates_per_type[t]) for t in arrays.ac_type], dtype=np.int64)
+    x_vars, y_vars = 0, 0
+    for group in groups:
+        idx = np.asarray(group, dtype=np.int64)
+        x_vars += int(n_gates[idx].sum())
+        pair_vars = np.triu(np.outer(n_gates[idx], n_gates[idx]), 1)
+        if sparse:
+            pair_vars = pair_vars * ((arrays.p[np.ix_(idx, idx)] + arrays.p[np.ix_(idx, idx)].T) > 0)
+        y_vars += int(pair_vars.sum())
+    return x_vars, y_vars
@@ -0,0 +1,93 @@
+import math
+import numpy as np
+from gurobipy import GRB
+
+TRACE_COLUMNS = ['iters', 'incumbent', 'bound', 'gap', 'runtime']
+
+def relativeGap(incumbent:float, bound:float) -> float:
+    if incumbent >= GRB.INFINITY or bound <= -GRB.INFINITY or incumbent != incumbent:
+        return math.inf
+    if incumbent == 0:
+        return 0.0 if bound == 0 else math.inf
+    return abs(incumbent - bound) / abs(incumbent)
+
+class ProgressRecorder:
+    """
+    Throttled recorder of the solver progress, for use in a callback.
+    A point is stored when the incumbent or bound changed, or when min_interval seconds passed since the last point.
+    The buffer is bounded: when it holds max_points, every second point that did not improve the incumbent
+    is dropped and min_interval is doubled, so long runs keep an evenly thinned trace.
+    """
+
+    def __init__(self, min_interval=0.5, max_points=2000):
+        self.min_interval = min_interval
+        self.max_points = max_points
+        self.columns = {name: [] for name in TRACE_COLUMNS}
+        self.improved = []
+        self.last_iters = 0.0
+
+    def __len__(self):
+        return len(self.improved)
+
+    def record(self, iters, incumbent, bound, runtime) -> None:
+        if iters is None:
+            iters = self.last_iters # not available in every callback
+        self.last_iters = iters
+
+        if self.improved:
+            last_incumbent, last_bound = self.columns['incumbent'][-1], self.columns['bound'][-1]
+            improved = incumbent < last_incumbent
+            if not improved and bound == last_bound and runtime - self.columns['runtime'][-1] < self.min_interval:
+                return
+        else:
+            improved = incumbent < GRB.INFINITY
+
+        for name, value in zip(TRACE_COLUMNS, (iters, incumbent, bound, relativeGap(incumbent, bound), runtime)):
+            self.columns[name].append(value)
+        self.improved.append(improved)
+
+        if len(self.improved) >= self.max_points:
+            self.thin()
+
+    def thin(self) -> None:
+        last = len(self.improved) - 1
+        keep = [i for i, improved in enumerate(self.improved) if improved or i % 2 == 0 or i == last]
+        self.columns  = {name: [values[i] for i in keep] for name, values in self.columns.items()}
+        self.improved = [self.improved[i] for i in keep]
+        self.min_interval *= 2
+
+    def finish(self, iters, incumbent, bound, runtime) -> None:
+        '''Always records the final state, the callback is not called after the last node'''
+        self.min_interval = 0.0
+        self.record(iters, incumbent, bound, runtime)
+
+    def as_arrays(self) -> dict:
+        return {name: np.array(values, dtype=float) for name, values in self.columns.items()}
+
+    def as_tuples(self) -> list:
+        return list(zip(*(self.columns[name] for name in TRACE_COLUMNS)))
+
+def timeToGap(trace:dict, target:float):
+    '''First runtime at which the gap of the trace is at most target, None if it never gets there'''
+    reached = np.flatnonzero(trace['gap'] <= target)
+    return float(trace['runtime'][reached[0]]) if len(reached) else None
+
+def primalIntegral(trace:dict, reference:float, end_time:float):
+    '''
+    Integral over [0, end_time] of the primal gap of the incumbent against reference (the best objective found),
+    following Berthold (2013): the gap is 1 without incumbent, else |reference - z| / max(|reference|, |z|).
+    Lower is better, it rewards finding good solutions early. None if there is no reference.
+    '''
+    if reference is None or len(trace['runtime']) == 0:
+        return None
+
+    runtime, incumbent = trace['runtime'], trace['incumbent']
+    with np.errstate(divide='ignore', invalid='ignore'):
+        scale = np.maximum(abs(reference), np.abs(incumbent))
+        gap = np.where(incumbent >= GRB.INFINITY, 1.0, np.where(scale > 0, np.abs(reference - incumbent) / scale, 0.0))
+
+    # Step function: each gap holds from its runtime until the next point, the gap before the first point is 1
+    starts = np.concatenate(([0.0], runtime))
+    ends   = np.concatenate((runtime, [max(end_time, runtime[-1])]))
+    values = np.concatenate(([1.0], gap))
+    return float(np.sum(values * (ends - starts)))
@@ -0,0 +1,47 @@
+import re
+import numpy as np
+
+RNG_MODES = ['legacy', 'crn']
+
+# Every random component gets its own stream, so drawing more or fewer values for one does not shift the others
+COMPONENTS     = {'arrival': 0, 'tat': 1, 'transfer': 2, 'local': 3}
+AIRCRAFT_TYPES = {'dom': 0, 'int': 1}
+
+def checkRngMode(rng:str) -> None:
+    if rng not in RNG_MODES:
+        raise ValueError(f'Unknown rng {rng}, choose from {RNG_MODES}')
+
+def aircraftKey(ac:str) -> tuple[int, int]:
+    '''
+    Returns (type, number) of an aircraft name from getAircraft, eg "int3" -> (1, 3).
+    The key only depends on the aircraft itself, not on how many other aircraft there are.
+    '''
+    ac_type, number = re.fullmatch(r'([a-z]+)(\d+)', ac).groups()
+    return AIRCRAFT_TYPES[ac_type], int(number)
+
+def componentStream(seed:int, component:str, *key:int) -> np.random.Generator:
+    '''Independent generator for one component of one aircraft (or pair of aircraft) of the instance with seed'''
+    return np.random.default_rng([seed, COMPONENTS[component], *key])
+
+def componentUniform(seed:int, component:str, *key:int) -> float:
+    '''
+    One uniform [0, 1) draw from the stream of the component and key.
+    Mapping the uniform onto a range instead of drawing from it directly keeps the draws of neighbouring
+    configurations (another time discretization or turnover time) close together.
+    '''
+    return float(componentStream(seed, component, *key).random())
+
+def partnerUniforms(seed:int, component:str, key:tuple, partners:list) -> np.ndarray:
+    '''
+    Uniform [0, 1) draws of the stream of the aircraft key for each of the partner aircraft keys.
+    The stream is read as one row with a fixed slot per possible partner, so the draw for a pair does not depend
+    on which other partners there are, while an instance needs one stream per aircraft instead of one per pair.
+    '''
+    slots = np.array([number * len(AIRCRAFT_TYPES) + ac_type for ac_type, number in partners], dtype=np.int64)
+    if len(slots) == 0:
+        return np.zeros(0)
+    return componentStream(seed, component, *key).random(int(slots.max()) + 1)[slots]
+
+def uniformIndex(u:float, n:int) -> int:
+    '''Index in range(n) of the uniform draw u'''
+    return min(int(u * n), n - 1)
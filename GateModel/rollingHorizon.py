@@ -0,0 +1,49 @@
+import math
+from typing import Dict, List
+
+from GateModel.apronMinimization import findGateSequences
+
+ROLLING_STATS = ['rolling_slices', 'rolling_blocks', 'apron_count']
+
+DEFAULT_HORIZON = {'length': 2.0, 'overlap': 0.5, 'workers': 2}
+
+def checkHorizon(horizon:dict) -> dict:
+    '''Returns the horizon settings completed with DEFAULT_HORIZON, the overlap has to be shorter than the slice length'''
+    horizon = {**DEFAULT_HORIZON, **(horizon or {})}
+    if horizon['length'] <= 0 or not 0 <= horizon['overlap'] < horizon['length']:
+        raise ValueError(f"Slice length {horizon['length']} and overlap {horizon['overlap']} need 0 <= overlap < length")
+    if horizon['workers'] < 1:
+        raise ValueError(f"workers has to be at least 1, got {horizon['workers']}")
+    return horizon
+
+def sliceStarts(arrivals:List[float], length:float, overlap:float) -> List[float]:
+    '''
+    Start times of the slices of a block of aircraft with the given arrival times.
+    A slice starting at t holds the aircraft arriving before t + length and commits those arriving before t + length - overlap,
+    the next slice starts at the first arrival that is not committed yet, so slices without arrivals are skipped.
+    '''
+    step, starts = length - overlap, []
+    pending = sorted(arrivals)
+    while pending:
+        t = pending[0]
+        starts.append(t)
+        pending = [arr for arr in pending if arr >= t + step]
+    return starts
+
+def releaseTimes(frozen:Dict[str, str], times:dict, gates:list) -> List[float]:
+    '''Time at which each of gates is free again after the aircraft frozen on it, -inf for a gate nothing is frozen on'''
+    release = {k: -math.inf for k in gates}
+    for ac, k in frozen.items():
+        if k in release:
+            release[k] = max(release[k], times[ac][1])
+    return [release[k] for k in gates]
+
+def placeOnFreeGates(free_times:dict, gates:list, release:List[float]) -> Dict[str, str]:
+    '''
+    Places the most aircraft of free_times {ac: (arrival, departure)} on gates that are free from their release time on,
+    the rest on the apron. Returns {ac: gate}, the number of aircraft on the apron is the minimum for this slice.
+    '''
+    assignment = {ac: 'apron' for ac in free_times}
+    for gate, sequence in zip(gates, findGateSequences(free_times, len(gates), release)):
+        assignment.update({ac: gate for ac in sequence})
+    return assignment
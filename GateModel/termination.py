@@ -0,0 +1,49 @@
+from gurobipy import GRB
+
+from GateModel.progressRecorder import relativeGap
+
+STATUS_REASONS = {GRB.OPTIMAL: 'optimal', GRB.TIME_LIMIT: 'time_limit', GRB.INFEASIBLE: 'infeasible',
+                  GRB.INF_OR_UNBD: 'infeasible', GRB.INTERRUPTED: 'interrupted', GRB.SUBOPTIMAL: 'suboptimal'}
+
+class TerminationMonitor:
+    """
+    Early termination criteria checked in the MIP callback, on top of the time limit.
+    gap:        stop once the relative gap is at most this value
+    stagnation: stop once neither the incumbent nor the bound improved by more than improvement_tol (relative)
+                for this many seconds, only after a first incumbent was found
+    A criterion that is None is not used. The criterion that stopped the solve is stored in reason.
+    """
+
+    def __init__(self, gap=None, stagnation=None, improvement_tol=1e-6):
+        self.gap = gap
+        self.stagnation = stagnation
+        self.improvement_tol = improvement_tol
+        self.reason = None
+
+        self.best_incumbent = GRB.INFINITY
+        self.best_bound = -GRB.INFINITY
+        self.last_improvement = 0.0
+
+    def active(self) -> bool:
+        return self.gap is not None or self.stagnation is not None
+
+    def check(self, incumbent:float, bound:float, runtime:float):
+        '''Returns the reason to terminate, or None to continue'''
+        scale = max(abs(incumbent) if incumbent < GRB.INFINITY else 1.0, 1.0)
+        if incumbent < self.best_incumbent - self.improvement_tol * scale:
+            self.best_incumbent, self.last_improvement = incumbent, runtime
+        if bound > self.best_bound + self.improvement_tol * scale:
+            self.best_bound, self.last_improvement = bound, runtime
+
+        if self.gap is not None and relativeGap(incumbent, bound) <= self.gap:
+            self.reason = 'target_gap'
+        elif (self.stagnation is not None and incumbent < GRB.INFINITY
+              and runtime - self.last_improvement >= self.stagnation):
+            self.reason = 'stagnation'
+        return self.reason
+
+def terminationReason(status:int, monitor:TerminationMonitor=None) -> str:
+    '''Why the solve stopped: the criterion of the monitor if it stopped it, else the Gurobi status'''
+    if monitor is not None and monitor.reason is not None and status == GRB.INTERRUPTED:
+        return monitor.reason
+    return STATUS_REASONS.get(status, f'status_{status}')
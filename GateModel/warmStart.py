@@ -0,0 +1,118 @@
+import numpy as np
+from typing import Dict, List
+
+from GateModel.ConstructParameters import InstanceArrays
+
+def assignmentObjective(arrays:InstanceArrays, assignment:Dict[str, str]) -> float:
+    '''
+    Returns the objective of BuildGateModel for a complete assignment {ac: gate}
+    Transfers are counted once per pair i<j with p[i,j], like the transfer term of the model.
+    '''
+    gate_idx = np.array([arrays.gate_index[assignment[ac]] for ac in arrays.aircraft], dtype=np.int64)
+
+    transfer = np.sum(np.triu(arrays.p, 1) * arrays.d[np.ix_(gate_idx, gate_idx)])
+    local    = np.sum((arrays.e + arrays.f) * arrays.ed[gate_idx])
+    return float(transfer + local)
+
+def assignSequencesToGates(arrays:InstanceArrays, sequences:List[List[str]], gates:list,
+                           assignment:Dict[str, str], max_passes:int=20) -> None:
+    '''
+    Places the gate sequences of one aircraft type on actual gates, updating assignment in place.
+    Sequences with the most passengers go to the gates closest to the entrance, after which sequences are
+    swapped between gates (used or unused) as long as that lowers the objective.
+    '''
+    gates = sorted([k for k in gates if k != 'apron'], key=lambda k: arrays.ed[arrays.gate_index[k]])
+    if not gates or not sequences:
+        return
+
+    # Passengers touching each aircraft: local passengers and transfers in both directions
+    volume = arrays.e + arrays.f + arrays.p.sum(axis=0) + arrays.p.sum(axis=1)
+    weight = [sum(volume[arrays.ac_index[ac]] for ac in seq) for seq in sequences]
+    order  = sorted(range(len(sequences)), key=lambda s: -weight[s])
+
+    # slots[k] is the index of the sequence at gates[k], or None if the gate stays empty
+    slots = [None] * len(gates)
+    for slot, s in enumerate(order):
+        slots[slot] = s
+
+    def place():
+        for slot, s in enumerate(slots):
+            if s is not None:
+                for ac in sequences[s]:
+                    assignment[ac] = gates[slot]
+
+    place()
+    best = assignmentObjective(arrays, assignment)
+    for _ in range(max_passes):
+        improved = False
+        for a in range(len(gates)):
+            for b in range(a + 1, len(gates)):
+                if slots[a] is None and slots[b] is None:
+                    continue
+                slots[a], slots[b] = slots[b], slots[a]
+                place()
+                obj = assignmentObjective(arrays, assignment)
+                if obj < best - 1e-9:
+                    best = obj
+                    improved = True
+                else:
+                    slots[a], slots[b] = slots[b], slots[a]
+                    place()
+        if not improved:
+            break
+
+def greedyAssignment(arrays:InstanceArrays, dom_gates:list, int_gates:list,
+                     dom_gate_paths:List[List[str]], int_gate_paths:List[List[str]]) -> Dict[str, str]:
+    '''
+    Returns a feasible assignment {ac: gate} to use as MIP start.
+    The gate sequences of findMinApron already fit without overlap and leave exactly NA_star aircraft for the apron,
+    so only the sequences have to be placed on gates of their own type.
+    '''
+    assignment = {ac: 'apron' for ac in arrays.aircraft}
+    assignSequencesToGates(arrays, dom_gate_paths, dom_gates, assignment)
+    assignSequencesToGates(arrays, int_gate_paths, int_gates, assignment)
+    return assignment
+
+def restrictAssignment(arrays:InstanceArrays, assignment:Dict[str, str], dom_gates:list, int_gates:list,
+                       NA_star:int) -> Dict[str, str]:
+    '''
+    Returns a feasible assignment {ac: gate} for this instance that follows assignment as closely as possible,
+    or None if it can not be repaired. Used to start from the solution of a neighbouring instance:
+    aircraft it does not have, or whose gate is not available here, go to the apron, and aircraft that overlap
+    at a gate are moved to the apron until the gate is free again. Then the apron count is brought to NA_star by
+    moving the apron aircraft with the most passengers to the closest free gate of their type,
+    or the gate aircraft with the fewest passengers to the apron.
+    '''
+    gates_per_type = {0: [k for k in dom_gates if k != 'apron'], 1: [k for k in int_gates if k != 'apron']}
+    volume = arrays.e + arrays.f + arrays.p.sum(axis=0) + arrays.p.sum(axis=1)
+
+    def overlaps(a:int, b:int) -> bool:
+        return arrays.arrivals[a] < arrays.departures[b] and arrays.arrivals[b] < arrays.departures[a]
+
+    def fits(ac:str, k:str, result:Dict[str, str]) -> bool:
+        a = arrays.ac_index[ac]
+        return not any(overlaps(a, arrays.ac_index[other]) for other, gate in result.items() if gate == k and other != ac)
+
+    # Aircraft in order of their arrival, so an aircraft keeps its gate over the ones that arrive later
+    result = {}
+    for ac in sorted(arrays.aircraft, key=lambda ac: arrays.arrivals[arrays.ac_index[ac]]):
+        k = assignment.get(ac, 'apron')
+        result[ac] = k if k in gates_per_type[arrays.ac_type[arrays.ac_index[ac]]] and fits(ac, k, result) else 'apron'
+    result = {ac: result[ac] for ac in arrays.aircraft}
+
+    on_apron = sorted([ac for ac, k in result.items() if k == 'apron'], key=lambda ac: -volume[arrays.ac_index[ac]])
+    for ac in on_apron:
+        if len([a for a in result if result[a] == 'apron']) <= NA_star:
+            break
+        free = [k for k in gates_per_type[arrays.ac_type[arrays.ac_index[ac]]] if fits(ac, k, result)]
+        if free:
+            result[ac] = min(free, key=lambda k: arrays.ed[arrays.gate_index[k]])
+
+    at_gate = sorted([ac for ac, k in result.items() if k != 'apron'], key=lambda ac: volume[arrays.ac_index[ac]])
+    n_apron = sum(k == 'apron' for k in result.values())
+    for ac in at_gate[:max(NA_star - n_apron, 0)]:
+        result[ac] = 'apron'
+
+    if sum(k == 'apron' for k in result.values()) != NA_star:
+        return None
+    return result
@@ -5,9 +5,10 @@ from pandas import DataFrame
 
 from SensitivityAnalysis.plotSensitivityAnalysis import plot_sensitivity_results
 from SensitivityAnalysis.runSensitivityAnalsyis import run_sensitivity_analysis
+from GateModel.modelPool import ModelPool
 
-def analysis_aircraft_vs_gates(limit:int=600, reps:int=1, file_postfix:str='aircraft_gates', window:str='set1') -> DataFrame:
-    """Analysis: Aircraft count vs gate count"""
+def analysis_aircraft_vs_gates(limit:int=600, reps:int=1, file_postfix:str='aircraft_gates', window:str='set1', nested:bool=False) -> DataFrame:
+    """Analysis: Aircraft count vs gate count. If nested, the aircraft counts form one nested family of instances."""
     t_start = time.time()
     
     df = run_sensitivity_analysis(
@@ -23,7 +24,8 @@ def analysis_aircraft_vs_gates(limit:int=600, reps:int=1, file_postfix:str='airc
         time_limit = limit,
         n_replications =reps,
         output_file=f'SensitivityAnalysis/SAoutputData/results_{file_postfix}.csv',
-        timetable_flag = False
+        timetable_flag = False,
+        nested_param = 'num_dom_aircraft' if nested else None
     )
     
     df.rename(columns={'num_dom_gates': 'n_gates',}, inplace=True)
@@ -96,8 +98,8 @@ def analysis_time_discretization(limit:int=600, reps:int=1, file_postfix:str='ti
     
     return df
 
-def analysis_turnaround_time(limit:int=600, reps:int=1, file_postfix:str='TAT', window:str='set1') -> DataFrame:
-    """Analysis 3: TAT"""
+def analysis_turnaround_time(limit:int=600, reps:int=1, file_postfix:str='TAT', window:str='set1', presolve:bool=False) -> DataFrame:
+    """Analysis 3: TAT. Short TATs leave many aircraft on their own, presolve fixes those and splits the rest."""
     t_start = time.time()
     
     df = run_sensitivity_analysis(
@@ -114,7 +116,8 @@ def analysis_turnaround_time(limit:int=600, reps:int=1, file_postfix:str='TAT',
         time_limit = limit,
         n_replications =reps,
         output_file=f'SensitivityAnalysis/SAoutputData/results_{file_postfix}.csv',
-        timetable_flag = False
+        timetable_flag = False,
+        solve_options = {'presolve': presolve}
     )
 
     # Plot objective and time vs turnaround time
@@ -141,40 +144,43 @@ def analysis_turnaround_time(limit:int=600, reps:int=1, file_postfix:str='TAT',
     
     return df
 
-def analysis_passenger_types(limit:int=600, reps:int=1, file_postfix:str='passenger_types',window:str='set1') -> DataFrame:
-    """Analysis 4: Passenger type comparison"""
+def analysis_passenger_types(limit:int=600, reps:int=1, file_postfix:str='passenger_types',window:str='set1', nested:bool=False) -> DataFrame:
+    """Analysis 4: Passenger type comparison. If nested, the aircraft counts form one nested family of instances."""
     t_start = time.time()
     
     num_dom_gates = 3
     
     passenger_types = ['no_transfer', 'paper', 'equal', 'only_transfer']
     scenario_names = ['No Transfer', 'Standard', 'Equal', 'Only Transfer']
-    dataframes = []
-    
-    for pax_type, scenario_name in zip(passenger_types, scenario_names):
-        df = run_sensitivity_analysis(
-            param_ranges={'num_dom_aircraft': np.arange(2, 16, 1)[::-1]},
-            fixed_params={
-                'num_dom_gates': num_dom_gates,
-                'num_int_aircraft': 0, 
-                'num_int_gates': 0,
-                'airport_window': window,
-                'time_disc': 1,
-                'dom_turnover': 1,
-                'passenger_type': pax_type
-            },
-            time_limit=limit,
-            n_replications=reps,
-            output_file=f'SensitivityAnalysis/SAoutputData/results_{pax_type}_{file_postfix}.csv',
-            timetable_flag=False
-        )
-        
-        df.rename(columns={'num_dom_gates': 'n_gates'}, inplace=True)
-        df['pax_scenario'] = scenario_name
-        dataframes.append(df)
-    
-    # Combine all scenarios
-    df_combined = pd.concat(dataframes, ignore_index=True)
+
+    # The scenarios share aircraft, gates and times and only differ in passenger numbers. With the passenger types
+    # varied last and the runs made replication by replication, the model of an instance is built for the first
+    # scenario and updated for the others, so the pool only ever holds the model of one instance
+    num_dom_aircraft = np.arange(2, 16, 1)[::-1]
+    model_pool = ModelPool(max_models=1)
+
+    df_combined = run_sensitivity_analysis(
+        param_ranges={'num_dom_aircraft': num_dom_aircraft, 'passenger_type': passenger_types},
+        fixed_params={
+            'num_dom_gates': num_dom_gates,
+            'num_int_aircraft': 0, 
+            'num_int_gates': 0,
+            'airport_window': window,
+            'time_disc': 1,
+            'dom_turnover': 1
+        },
+        time_limit=limit,
+        n_replications=reps,
+        output_file=f'SensitivityAnalysis/SAoutputData/results_pax_types_{file_postfix}.csv',
+        timetable_flag=False,
+        model_pool=model_pool,
+        nested_param='num_dom_aircraft' if nested else None
+    )
+    model_pool.clear()
+
+    df_combined.rename(columns={'num_dom_gates': 'n_gates'}, inplace=True)
+    df_combined['pax_scenario'] = df_combined['passenger_type'].map(dict(zip(passenger_types, scenario_names)))
+
     df_combined.to_csv(f'SensitivityAnalysis/SAoutputData/results_all_scenarios_{file_postfix}.csv', index=False)
     
     # Plot combined results
@@ -192,7 +198,8 @@ def analysis_passenger_types(limit:int=600, reps:int=1, file_postfix:str='passen
     
     return df_combined
 
-def analysis_validation(limit:int= 600, reps:int=1, file_postfix:str='validation', window:str='set1') -> DataFrame:
+def analysis_validation(limit:int= 600, reps:int=1, file_postfix:str='validation', window:str='set1', split_types:bool=False) -> DataFrame:
+    """Validation sizes. With split_types, the domestic and international halves are solved concurrently."""
     t_start = time.time()
 
     df = run_sensitivity_analysis(
@@ -213,7 +220,8 @@ def analysis_validation(limit:int= 600, reps:int=1, file_postfix:str='validation
         n_replications=reps,
         output_file=f'SensitivityAnalysis/SAoutputData/results_{file_postfix}.csv',
         timetable_flag=False,
-        zip_groups = [['num_dom_aircraft', 'num_int_aircraft'],['num_dom_gates','num_int_gates']]
+        zip_groups = [['num_dom_aircraft', 'num_int_aircraft'],['num_dom_gates','num_int_gates']],
+        solve_options = {'split_types': split_types}
     )
 
     t_end = time.time()
@@ -221,7 +229,8 @@ def analysis_validation(limit:int= 600, reps:int=1, file_postfix:str='validation
     
     return df
 
-def analysis_layouts(limit:int= 600, reps:int=1, file_postfix:str='validation', window:str='set1') -> DataFrame:
+def analysis_layouts(limit:int= 600, reps:int=1, file_postfix:str='validation', window:str='set1', nested:bool=False) -> DataFrame:
+    """Layout comparison. If nested, the aircraft counts form one nested family of instances."""
     t_start = time.time()
 
     airports = ['BER','VIE']
@@ -246,7 +255,8 @@ def analysis_layouts(limit:int= 600, reps:int=1, file_postfix:str='validation',
             time_limit = limit,
             n_replications=reps,
             output_file=f'SensitivityAnalysis/SAoutputData/results_{file_postfix}.csv',
-            timetable_flag=False
+            timetable_flag=False,
+            nested_param='num_dom_aircraft' if nested else None
         )
         df['airport_name'] = airport
         dataframes.append(df)
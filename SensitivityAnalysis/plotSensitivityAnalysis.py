@@ -2,10 +2,21 @@ import numpy as np
 import matplotlib.pyplot as plt
 from   matplotlib.ticker import MaxNLocator
 
+def mean_and_spread(df, x_param, metric):
+    """
+    Mean of metric per x_param value with the half-width of its band: the confidence interval
+    of the replications (<metric>_ci) when the results have it, else the std over the rows.
+    """
+    if f'{metric}_ci' in df.columns:
+        grouped = df.groupby(x_param).agg(mean=(metric, 'mean'), spread=(f'{metric}_ci', 'mean'))
+    else:
+        grouped = df.groupby(x_param)[metric].agg(['mean', 'std']).rename(columns={'std': 'spread'})
+    return grouped
+
 def plot_sensitivity_results(df, x_param, metrics=['objective', 'total_time'], 
                              group_by=None, save_path=None, x_label = 'x_label', secondary_axis = None):
     """
-    Plot sensitivity analysis results with error bars or shaded regions.
+    Plot sensitivity analysis results with shaded regions, the confidence interval if the results have one.
     """
     n_metrics = len(metrics)
     fig, axes = plt.subplots(1, n_metrics, figsize=(6*n_metrics, 5))
@@ -16,7 +27,7 @@ def plot_sensitivity_results(df, x_param, metrics=['objective', 'total_time'],
         if group_by and group_by in df.columns:
             for group_val in sorted(df[group_by].unique()):
                 subset = df[df[group_by] == group_val]
-                grouped = subset.groupby(x_param)[metric].agg(['mean', 'std'])
+                grouped = mean_and_spread(subset, x_param, metric)
 
                 if x_param in ['dom_turnover']:
                     x_vals = grouped.index * 60
@@ -26,13 +37,13 @@ def plot_sensitivity_results(df, x_param, metrics=['objective', 'total_time'],
                 ax.plot(x_vals, grouped['mean'], marker='o', label=f'{group_val}')
                 ax.fill_between(
                     x_vals,
-                    grouped['mean'] - grouped['std'],
-                    grouped['mean'] + grouped['std'],
+                    grouped['mean'] - grouped['spread'],
+                    grouped['mean'] + grouped['spread'],
                     alpha=0.2
                 )
                 
         else:
-            grouped = df.groupby(x_param)[metric].agg(['mean', 'std'])
+            grouped = mean_and_spread(df, x_param, metric)
 
             if x_param in ['dom_turnover']:
                 x_vals = grouped.index * 60
@@ -41,8 +52,8 @@ def plot_sensitivity_results(df, x_param, metrics=['objective', 'total_time'],
             
             ax.plot(x_vals, grouped['mean'], marker='o', color='steelblue')
             ax.fill_between(x_vals, 
-                            grouped['mean'] - grouped['std'],
-                            grouped['mean'] + grouped['std'], 
+                            grouped['mean'] - grouped['spread'],
+                            grouped['mean'] + grouped['spread'], 
                             alpha=0.2, color='steelblue')
 
     #         time_disc = np.arange(0.25,4.,0.05)
@@ -1,17 +1,83 @@
 
+import os
+import csv
+import json
+import math
+import inspect
+import numpy as np
 import pandas as pd
+from scipy import stats
 from itertools import product
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+try:
+    import resource
+except ImportError: # not available on Windows
+    resource = None
 
 from GateModel.GateAssignmentProblem import GateAssignmentProblem
+from GateModel.instanceCache import InstanceCache, stableHash
+from GateModel.presolve import PRESOLVE_STATS
+from GateModel.rollingHorizon import ROLLING_STATS
+
+CI_METRICS = ['objective', 'objective/pax', 'total_time']
+
+# Arguments of solve that run_replication sets itself, from the arguments of run_sensitivity_analysis
+RUNNER_SOLVE_ARGUMENTS = ['time_limit', 'verbose', 'plot_timetable_flag', 'model_pool']
+
+# Parameters in param_ranges with these names are passed to solve instead of the problem config,
+# e.g. {'formulation': ['linearized', 'quadratic']} compares the formulations in one sweep
+SOLVE_PARAMETERS = [name for name in inspect.signature(GateAssignmentProblem.solve).parameters
+                    if name not in ['self'] + RUNNER_SOLVE_ARGUMENTS]
 
 def run_sensitivity_analysis(param_ranges, fixed_params=None, time_limit=3600, 
-                             n_replications=1, output_file='sensitivity_results.csv', timetable_flag = None, zip_groups=None):
-    """Run sensitivity analysis over parameter ranges."""
+                             n_replications=1, output_file='sensitivity_results.csv', timetable_flag = None, zip_groups=None,
+                             solve_options=None, workers=1, resume=True, cache_dir=None, model_pool=None,
+                             save_traces=True, combination_budget=None, ci_metrics=None, ci_target=None, ci_level=0.95,
+                             min_replications=5, nested_param=None):
+    """
+    Run sensitivity analysis over parameter ranges. solve_options are passed on to GateAssignmentProblem.solve,
+    param_ranges may also vary solve options (see SOLVE_PARAMETERS).
+    With workers > 1 the (combination, replication) runs are spread over a process pool.
+    Every finished run is appended to <output_file>_raw.csv right away. With resume, runs whose config hash
+    is already in that file are skipped, so an interrupted sweep can be restarted with the same call.
+    Without resume, the file is emptied first.
+    With a cache_dir, instances and solve results are stored in an InstanceCache there and identical runs are not redone.
+    A ModelPool as model_pool reuses built models between runs with the same instance structure, also across calls.
+    The runs are then made replication by replication, so varied parameters that keep the structure (e.g. passenger_type)
+    reuse the model of the previous run and a pool of one model is enough.
+    With save_traces, the solver progress trace of every run is saved as <output_file>_traces/<config hash>.npz.
+    Early termination criteria go in solve_options, e.g. {'termination': {'gap': 0.01, 'stagnation': 60}}.
+    combination_budget caps the total solve seconds of the replications of one combination: serially every run gets
+    an equal share of what is left over for the replications the combination can still get, and once it is spent no
+    more replications are run; in parallel every run gets an equal share up front.
+    With a ci_target, replications are sequential: every combination starts with min_replications seeds and gets
+    min_replications more until the ci_level confidence interval half-width of each of ci_metrics (default objective/pax)
+    is at most ci_target times its mean, or n_replications is reached.
+    The CSV has the half-width of CI_METRICS and ci_metrics as <metric>_ci and the replications used as n_replications.
+    With a nested_param (e.g. num_dom_aircraft), the instances are generated as one nested family (rng='crn' with the
+    family_size of the largest instance) and every run starts from the solution of the previous run of the same
+    replication that only differed in nested_param, restricted to its aircraft. This needs workers=1. The solutions are
+    kept in the raw file, so a resumed sweep continues the chain. Passenger types that are not nested
+    (see GateAssignmentProblem.NESTED_PASSENGER_TYPES) are generated with rng='crn' but without family_size or starts.
+    """
 
     # Setup base configuration
     base_config = GateAssignmentProblem.DEFAULT_CONFIG.copy()
     if fixed_params:
         base_config.update(fixed_params)
+    solve_options = solve_options or {}
+    if model_pool is not None and workers > 1:
+        raise ValueError('A model_pool can only be used with workers=1, built models can not be shared between processes')
+    if nested_param is not None and workers > 1:
+        raise ValueError('A nested_param can only be used with workers=1, every run starts from the solution of the previous one')
+    reserved = [name for name in RUNNER_SOLVE_ARGUMENTS if name in param_ranges or name in solve_options]
+    if reserved:
+        raise ValueError(f'{reserved} can not be varied or set in solve_options, they are arguments of run_sensitivity_analysis')
+    if combination_budget is not None and combination_budget <= 0:
+        raise ValueError(f'combination_budget has to be positive, got {combination_budget}')
+    if nested_param is not None and nested_param not in param_ranges:
+        raise ValueError(f'nested_param {nested_param} is not one of the varied parameters')
     
       
     # Generate parameter combinations with selective zipping
@@ -61,69 +127,143 @@ def run_sensitivity_analysis(param_ranges, fixed_params=None, time_limit=3600,
         param_values = [param_ranges[p] for p in varying_params]
         combinations = list(product(*param_values))
     
-    total_runs = len(combinations) * n_replications
-    
+    # Gurobi threads are split over the workers so the machine is not oversubscribed
+    if workers > 1 and 'threads' not in solve_options:
+        solve_options = {**solve_options, 'threads': max(1, (os.cpu_count() or 1) // workers)}
 
-    # Run experiments, avg over n_replications.
-    results = []
+    raw_file = os.path.splitext(output_file)[0] + '_raw.csv'
+    trace_dir = os.path.splitext(output_file)[0] + '_traces' if save_traces else None
+    if trace_dir:
+        os.makedirs(trace_dir, exist_ok=True)
+    if not resume and os.path.exists(raw_file):
+        open(raw_file, 'w').close() # a fresh sweep, the averages are taken from this file
+    finished = load_raw_results(raw_file) if resume else {}
+
+    # The budget changes the time limits, so it is part of the run hash when set
+    hash_options = solve_options if combination_budget is None else {**solve_options, 'combination_budget': combination_budget}
+
+    combination_params = {}
+    run_hashes = {}
     for run_idx, combo in enumerate(combinations, 1):
         params = base_config.copy()
         for param_name, param_value in zip(varying_params, combo):
             params[param_name] = param_value
-        
-        # Store results for this specific parameter combination
-        replication_results = []
-        n_non_optimal = 0
-        
+        combination_params[run_idx] = (params, dict(zip(varying_params, combo)))
+
+    # One nested family of instances, scaled on the largest instance of the sweep. Passenger types that are not
+    # nested keep the common random numbers but get no family_size and start every run from scratch.
+    nested_runs = set()
+    if nested_param is not None:
+        family_size = max(params['num_dom_aircraft'] + params['num_int_aircraft'] for params, _ in combination_params.values())
+        for run_idx, (params, _) in combination_params.items():
+            params['rng'] = 'crn'
+            if params['passenger_type'] in GateAssignmentProblem.NESTED_PASSENGER_TYPES:
+                params['family_size'] = int(family_size)
+                nested_runs.add(run_idx)
+        skipped = sorted({params['passenger_type'] for run_idx, (params, _) in combination_params.items() if run_idx not in nested_runs})
+        if skipped:
+            print(f'Passenger types {skipped} do not give nested instances, their runs start from scratch')
+
+    for run_idx, (params, varying) in combination_params.items():
         for rep in range(n_replications):
-            print(f"\nRun {(run_idx-1)*n_replications + rep + 1}/{total_runs}: "
-                    f"{dict(zip(varying_params, combo))}, rep {rep+1}")
-            
-            # Run single experiment
-            params['seed'] = rep
-            problem = GateAssignmentProblem(**params)
-            result = problem.solve(time_limit=time_limit, verbose=False, plot_timetable_flag=timetable_flag)
-
-            if result ['status'] == 9:
-                n_non_optimal += 1
-            
-            result_dict = {
-                'replication': rep,
-                **{p: v for p, v in zip(varying_params, combo)},
-                'objective': result['objective'],
-                'gap': result['gap'],
-                'build_time': result['build_time'],
-                'solve_time': result['solve_time'],
-                'total_time': result['total_time'],
-                'status': result['status'],
-                'NA_star': result['NA_star'],
-                'total_pax': result['total_pax'],
-                'objective/pax': result['objective/pax']
-            }
-            
-            replication_results.append(result_dict)
-        
-        # Calculate averages ONLY for this specific parameter combination
-        # (averaging across the n_replications we just completed)
-        valid_objectives = [r['objective'] for r in replication_results if r['objective'] is not None]
-        valid_gaps = [r['gap'] for r in replication_results if r['gap'] is not None]
-        
-        averaged_result = {
-            **{p: v for p, v in zip(varying_params, combo)},
-            'n_replications': n_replications,
-            'objective': sum(valid_objectives) / len(valid_objectives) if valid_objectives else None,
-            'gap': sum(valid_gaps) / len(valid_gaps) if valid_gaps else None,
-            'build_time': sum(r['build_time'] for r in replication_results) / n_replications,
-            'solve_time': sum(r['solve_time'] for r in replication_results) / n_replications,
-            'total_time': sum(r['total_time'] for r in replication_results) / n_replications,
-            'status_summary': ','.join(str(r['status']) for r in replication_results),
-            'NA_star': sum(r['NA_star'] for r in replication_results) / n_replications,
-            'total_pax': sum(r['total_pax'] for r in replication_results) / n_replications,
-            'objective/pax': sum(r['objective/pax'] for r in replication_results) / n_replications,
-            'n_non_optimal': n_non_optimal
-        }
-        
-        results.append(averaged_result)
+            run_hashes[run_idx, rep] = config_hash({**params, 'seed': rep}, time_limit, hash_options)
+
+    # Sequential mode starts every combination with min_replications and adds more while its CI is too wide
+    sequential = ci_target is not None
+    ci_metrics = ci_metrics or (['objective/pax'] if sequential else [])
+    n_reps = {run_idx: min(min_replications, n_replications) if sequential else n_replications for run_idx in combination_params}
+    budget_left = {run_idx: combination_budget for run_idx in combination_params}
+
+    # Last solution per replication and values of the other varied parameters, the start of the next nested run
+    def neighbour_key(varying, rep):
+        return rep, tuple((name, value) for name, value in varying.items() if name != nested_param)
+    nested_solutions = {}
+
+    first_round = True
+    while True:
+        round_runs = [((run_idx, rep), params, varying) for run_idx, (params, varying) in combination_params.items()
+                      for rep in range(n_reps[run_idx])]
+        if model_pool is not None:
+            # Replication-major, so the combinations of one seed that share the instance structure follow each other
+            # and the pool only has to hold their model. The order of the combinations within a replication is kept.
+            round_runs.sort(key=lambda job: job[0][1])
+        jobs = [job for job in round_runs if run_hashes[job[0]] not in finished]
+
+        requested = sum(n_reps.values())
+        if first_round and len(jobs) < requested:
+            print(f"\nResuming from {raw_file}: {requested - len(jobs)}/{requested} runs already finished")
+        first_round = False
+
+        # Run experiments, each (combination, replication) is independent because the seed is set per replication
+        if workers > 1:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                run_time_limit = time_limit if combination_budget is None else min(time_limit, combination_budget / n_replications)
+                futures = {pool.submit(run_replication, params, rep, varying, run_time_limit, timetable_flag, solve_options, cache_dir,
+                                       trace_file=trace_path(trace_dir, run_hashes[run_idx, rep])): (run_idx, rep)
+                           for (run_idx, rep), params, varying in jobs}
+
+                for n_done, future in enumerate(as_completed(futures), 1):
+                    run_idx, rep = futures[future]
+                    row = {'config_hash': run_hashes[run_idx, rep], **future.result()}
+                    append_raw_result(raw_file, row)
+                    finished[row['config_hash']] = row
+                    print(f"\nFinished {n_done}/{len(jobs)}: {dict(zip(varying_params, combinations[run_idx-1]))}, rep {rep+1}")
+        else:
+            n_run = 0
+            for (run_idx, rep), params, varying in (round_runs if nested_runs else jobs):
+                run_hash = run_hashes[run_idx, rep]
+                if run_hash in finished:
+                    # A run finished before resuming still passes its solution on to the next nested run
+                    if run_idx in nested_runs and finished[run_hash].get('assignment'):
+                        nested_solutions[neighbour_key(varying, rep)] = json.loads(finished[run_hash]['assignment'])
+                    continue
+                n_run += 1
+                run_time_limit = time_limit
+                if combination_budget is not None:
+                    # A spent budget ends the combination at the replications it has, the first one always runs
+                    if budget_left[run_idx] <= 0 and rep > 0:
+                        n_reps[run_idx] = min(n_reps[run_idx], rep)
+                        continue
+                    # The remaining budget is shared by the replications this combination can still get
+                    reps_done = sum(run_hashes[run_idx, r] in finished for r in range(n_replications))
+                    run_time_limit = min(time_limit, max(budget_left[run_idx], 0) / (n_replications - reps_done))
+                print(f"\nRun {n_run}/{len(jobs)}: {varying}, rep {rep+1}")
+                trace_file = trace_path(trace_dir, run_hashes[run_idx, rep])
+                if run_idx not in nested_runs:
+                    result_dict = run_replication(params, rep, varying, run_time_limit, timetable_flag, solve_options, cache_dir,
+                                                  model_pool, trace_file)
+                else:
+                    result_dict, assignment = run_replication(
+                        params, rep, varying, run_time_limit, timetable_flag, solve_options, cache_dir, model_pool, trace_file,
+                        start_assignment=nested_solutions.get(neighbour_key(varying, rep)), return_assignment=True)
+                    nested_solutions[neighbour_key(varying, rep)] = assignment
+                    result_dict['assignment'] = json.dumps(assignment) if assignment else None # to continue after a resume
+                if combination_budget is not None:
+                    budget_left[run_idx] -= result_dict['solve_time']
+                row = {'config_hash': run_hash, **result_dict}
+                append_raw_result(raw_file, row)
+                finished[row['config_hash']] = row
+
+        if not sequential:
+            break
+
+        spent = {run_idx for run_idx in combination_params if combination_budget is not None and budget_left[run_idx] <= 0}
+        unconverged = [run_idx for run_idx in combination_params
+                       if n_reps[run_idx] < n_replications and run_idx not in spent and not ci_converged(
+                       [finished[run_hashes[run_idx, rep]] for rep in range(n_reps[run_idx])], ci_metrics, ci_target, ci_level)]
+        if not unconverged:
+            break
+        print(f"\n{len(unconverged)}/{len(combination_params)} combinations have not reached the CI target, adding replications")
+        for run_idx in unconverged:
+            n_reps[run_idx] = min(n_reps[run_idx] + min_replications, n_replications)
+
+    # Avg over the replications from the raw rows on disk, in the order of the combinations
+    # regardless of the order the runs finished in
+    finished = load_raw_results(raw_file)
+    results = []
+    for run_idx, (params, varying) in combination_params.items():
+        replication_results = [{**finished[run_hashes[run_idx, rep]], **varying} for rep in range(n_reps[run_idx])]
+        results.append(average_replications(varying, replication_results, ci_metrics, ci_level))
 
     # Save averaged results (one row per parameter combination)
     df = pd.DataFrame(results)
@@ -131,3 +271,177 @@ def run_sensitivity_analysis(param_ranges, fixed_params=None, time_limit=3600,
     print(f"\nAveraged results saved to {output_file}")
     
     return df
+
+def config_hash(params, time_limit, solve_options):
+    """Hash of everything that determines the outcome of a single run."""
+    return stableHash({'params': params, 'time_limit': time_limit, 'solve_options': solve_options})
+
+def trace_path(trace_dir, run_hash):
+    return os.path.join(trace_dir, f'{run_hash}.npz') if trace_dir else None
+
+def save_trace(trace_file, trace):
+    """Store a progress trace as compressed columns, written to a temporary file first so it is never half written."""
+    tmp_file = f'{trace_file}.{os.getpid()}.tmp.npz'
+    np.savez_compressed(tmp_file, **trace)
+    os.replace(tmp_file, trace_file)
+
+def append_raw_result(raw_file, row):
+    """
+    Append one finished run to the raw results file and make sure it is on disk before continuing.
+    If the row has columns the file does not have yet, e.g. when resuming on a file of an older version,
+    the file is rewritten with the extra columns first (empty for the earlier rows), so no column is dropped.
+    """
+    new_file = not os.path.exists(raw_file) or os.path.getsize(raw_file) == 0
+    if new_file:
+        fieldnames = list(row.keys())
+    else:
+        with open(raw_file, newline='') as f:
+            fieldnames = next(csv.reader(f))
+        missing = [key for key in row if key not in fieldnames]
+        if missing:
+            fieldnames = fieldnames + missing
+            with open(raw_file, newline='') as f:
+                rows = list(csv.DictReader(f))
+            tmp_file = f'{raw_file}.{os.getpid()}.tmp'
+            with open(tmp_file, 'w', newline='') as f:
+                writer = csv.DictWriter(f, fieldnames=fieldnames, extrasaction='ignore')
+                writer.writeheader()
+                writer.writerows(rows)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_file, raw_file)
+
+    with open(raw_file, 'a', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames)
+        if new_file:
+            writer.writeheader()
+        writer.writerow(row)
+        f.flush()
+        os.fsync(f.fileno())
+
+def load_raw_results(raw_file):
+    """Returns {config_hash: row} of the finished runs in the raw results file, skipping a half written last line."""
+    if not os.path.exists(raw_file) or os.path.getsize(raw_file) == 0:
+        return {}
+
+    df = pd.read_csv(raw_file, on_bad_lines='skip')
+    df = df.dropna(subset=['config_hash', 'status'])
+
+    finished = {}
+    for row in df.to_dict('records'):
+        finished[row['config_hash']] = {k: None if isinstance(v, float) and math.isnan(v) else v for k, v in row.items()}
+    return finished
+
+def run_replication(params, rep, varying, time_limit, timetable_flag, solve_options, cache_dir=None, model_pool=None,
+                    trace_file=None, start_assignment=None, return_assignment=False):
+    """
+    Run a single experiment and return its row of results. Module level so it can run in a worker process.
+    The progress trace of the solve is saved to trace_file if given.
+    start_assignment is passed on to solve as MIP start. With return_assignment, the solution {ac: gate}
+    is returned after the row (None without a solution).
+    """
+    params = {**params, 'seed': rep}
+    solve_options = {**solve_options, **{name: params.pop(name) for name in SOLVE_PARAMETERS if name in params}}
+    if start_assignment is not None:
+        solve_options['start_assignment'] = start_assignment
+    cache = InstanceCache(cache_dir) if cache_dir else None
+    problem = GateAssignmentProblem(cache=cache, **params)
+    result = problem.solve(time_limit=time_limit, verbose=False, plot_timetable_flag=timetable_flag, model_pool=model_pool,
+                           **solve_options)
+    if trace_file:
+        save_trace(trace_file, result['trace'])
+
+    row = {
+        'replication': rep,
+        **varying,
+        'objective': result['objective'],
+        'gap': result['gap'],
+        'build_time': result['build_time'],
+        'solve_time': result['solve_time'],
+        'total_time': result['total_time'],
+        'status': result['status'],
+        'termination_reason': result['termination_reason'],
+        'formulation': result['formulation'],
+        'model_reused': result.get('model_reused', False),
+        'NA_star': result['NA_star'],
+        'total_pax': result['total_pax'],
+        'objective/pax': result['objective/pax'],
+        'pruned_y_vars': result['pruned_y_vars'],
+        'warm_start_objective': result['warm_start_objective'],
+        'time_to_first_incumbent': result['time_to_first_incumbent'],
+        'time_to_1pct_gap': result['time_to_1pct_gap'],
+        'primal_integral': result['primal_integral'],
+        'heuristic_gap': result.get('heuristic_gap'),
+        **{key: result.get(key) for key in GateAssignmentProblem.PHASE_TIMES + GateAssignmentProblem.COUNTERS + PRESOLVE_STATS + ROLLING_STATS},
+        'peak_rss_mb': peak_rss_mb()
+    }
+    if return_assignment:
+        return row, {ac: k for ac, (k, _) in result['x_solution'].items()} or None
+    return row
+
+def peak_rss_mb():
+    """Peak resident memory of this process in MB, None where the resource module is not available."""
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024 # kB on Linux
+
+def mean_or_none(values):
+    """Mean of the values that are not None, None if there are none."""
+    values = [v for v in values if v is not None]
+    return sum(values) / len(values) if values else None
+
+def ci_half_width(values, level=0.95):
+    """Half-width of the Student t confidence interval of the mean, None with fewer than two values."""
+    values = [v for v in values if v is not None]
+    if len(values) < 2:
+        return None
+    return float(stats.t.ppf((1 + level) / 2, len(values) - 1) * np.std(values, ddof=1) / math.sqrt(len(values)))
+
+def ci_converged(replication_results, metrics, target, level=0.95):
+    """True if the CI half-width of every metric is at most target times the absolute mean."""
+    for metric in metrics:
+        values = [r[metric] for r in replication_results if r.get(metric) is not None]
+        half_width = ci_half_width(values, level)
+        if half_width is None or half_width > target * abs(np.mean(values)):
+            return False
+    return True
+
+def average_replications(varying, replication_results, ci_metrics=None, ci_level=0.95):
+    """
+    Calculate averages ONLY for this specific parameter combination, across its replications,
+    with the confidence interval half-width of CI_METRICS and ci_metrics.
+    """
+    n_replications = len(replication_results)
+    n_non_optimal = sum(1 for r in replication_results if r['status'] != 2) # time limit, early termination or heuristic
+
+    valid_objectives = [r['objective'] for r in replication_results if r['objective'] is not None]
+    valid_gaps = [r['gap'] for r in replication_results if r['gap'] is not None]
+    
+    return {
+        **varying,
+        'n_replications': n_replications,
+        'objective': sum(valid_objectives) / len(valid_objectives) if valid_objectives else None,
+        'gap': sum(valid_gaps) / len(valid_gaps) if valid_gaps else None,
+        'build_time': sum(r['build_time'] for r in replication_results) / n_replications,
+        'solve_time': sum(r['solve_time'] for r in replication_results) / n_replications,
+        'total_time': sum(r['total_time'] for r in replication_results) / n_replications,
+        'status_summary': ','.join(str(r['status']) for r in replication_results),
+        'termination_summary': ','.join(str(r.get('termination_reason')) for r in replication_results),
+        'formulation': replication_results[0].get('formulation'),
+        'model_reused': mean_or_none([r.get('model_reused') for r in replication_results]),
+        'NA_star': sum(r['NA_star'] for r in replication_results) / n_replications,
+        'total_pax': sum(r['total_pax'] for r in replication_results) / n_replications,
+        'objective/pax': sum(r['objective/pax'] for r in replication_results) / n_replications,
+        'pruned_y_vars': sum(r['pruned_y_vars'] for r in replication_results) / n_replications,
+        'warm_start_objective': mean_or_none([r['warm_start_objective'] for r in replication_results]),
+        'time_to_first_incumbent': mean_or_none([r['time_to_first_incumbent'] for r in replication_results]),
+        'time_to_1pct_gap': mean_or_none([r.get('time_to_1pct_gap') for r in replication_results]),
+        'primal_integral': mean_or_none([r.get('primal_integral') for r in replication_results]),
+        'heuristic_gap': mean_or_none([r.get('heuristic_gap') for r in replication_results]),
+        **{key: mean_or_none([r.get(key) for r in replication_results])
+           for key in GateAssignmentProblem.PHASE_TIMES + GateAssignmentProblem.COUNTERS + PRESOLVE_STATS + ROLLING_STATS},
+        'peak_rss_mb': max((r['peak_rss_mb'] for r in replication_results if r.get('peak_rss_mb') is not None), default=None),
+        'n_non_optimal': n_non_optimal,
+        **{f'{metric}_ci': ci_half_width([r.get(metric) for r in replication_results], ci_level)
+           for metric in dict.fromkeys(CI_METRICS + list(ci_metrics or []))}
+    }